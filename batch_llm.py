@@ -0,0 +1,116 @@
+"""
+Modo batch (offline) para as reescritas via OpenAI e Mistral.
+
+Em vez de uma chamada síncrona por query, todas as requisições de uma
+varredura vão para um arquivo JSONL, que é enviado ao endpoint de batch
+do provedor. O job é acompanhado por polling e, quando termina, as
+respostas voltam como {custom_id: texto} para a etapa de medição.
+
+Para apontar para um servidor local (mock), basta configurar o cliente
+com base_url (OpenAI) / server_url (Mistral) antes de chamar submit_*.
+"""
+import json
+import time
+
+CHAT_ENDPOINT = "/v1/chat/completions"
+POLL_SECS = 30
+
+OPENAI_DONE = ("completed", "failed", "expired", "cancelled")
+MISTRAL_DONE = ("SUCCESS", "FAILED", "TIMEOUT_EXCEEDED", "CANCELLED")
+
+
+def custom_id_for(query_id) -> str:
+    return f"q{query_id}"
+
+
+def write_batch_file(path: str, bodies, with_url: bool = True):
+    """
+    bodies: lista de (custom_id, body) onde body é o payload do chat.
+    OpenAI exige method/url em cada linha; a Mistral só custom_id/body.
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        for custom_id, body in bodies:
+            line = {"custom_id": custom_id, "body": body}
+            if with_url:
+                line["method"] = "POST"
+                line["url"] = CHAT_ENDPOINT
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+    return path
+
+
+def parse_batch_output(text: str):
+    """
+    Converte o JSONL de saída em {custom_id: conteúdo da resposta}.
+    Linhas com erro viram string vazia (a reescrita é tratada como falha).
+    """
+    results = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        rec = json.loads(line)
+        content = ""
+        resp = rec.get("response") or {}
+        body = resp.get("body") or {}
+        choices = body.get("choices") or []
+        if choices and not rec.get("error"):
+            content = (choices[0].get("message") or {}).get("content") or ""
+        results[rec.get("custom_id")] = content
+    return results
+
+
+def _wait(get_status, done_states, poll_secs, label):
+    while True:
+        job = get_status()
+        status = job.status
+        print(f"[batch {label}] status: {status}")
+        if status in done_states:
+            return job
+        time.sleep(poll_secs)
+
+
+# ===== OPENAI =====
+
+
+def submit_openai(client, path: str, poll_secs: int = POLL_SECS):
+    """
+    Sobe o arquivo, cria o batch e espera terminar.
+    Retorna {custom_id: texto}.
+    """
+    with open(path, "rb") as f:
+        uploaded = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=uploaded.id,
+        endpoint=CHAT_ENDPOINT,
+        completion_window="24h",
+    )
+    batch = _wait(lambda: client.batches.retrieve(batch.id),
+                  OPENAI_DONE, poll_secs, batch.id)
+    if batch.status != "completed" or not batch.output_file_id:
+        raise RuntimeError(f"Batch OpenAI terminou com status {batch.status}.")
+    return parse_batch_output(client.files.content(batch.output_file_id).text)
+
+
+# ===== MISTRAL =====
+
+
+def submit_mistral(client, path: str, model: str, poll_secs: int = POLL_SECS):
+    """
+    Sobe o arquivo, cria o job de batch e espera terminar.
+    Retorna {custom_id: texto}.
+    """
+    with open(path, "rb") as f:
+        uploaded = client.files.upload(
+            file={"file_name": path.rsplit("/", 1)[-1], "content": f.read()},
+            purpose="batch",
+        )
+    job = client.batch.jobs.create(
+        input_files=[uploaded.id],
+        model=model,
+        endpoint=CHAT_ENDPOINT,
+    )
+    job = _wait(lambda: client.batch.jobs.get(job_id=job.id),
+                MISTRAL_DONE, poll_secs, job.id)
+    if job.status != "SUCCESS" or not job.output_file:
+        raise RuntimeError(f"Batch Mistral terminou com status {job.status}.")
+    out = client.files.download(file_id=job.output_file)
+    return parse_batch_output(out.read().decode("utf-8"))
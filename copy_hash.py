@@ -0,0 +1,67 @@
+"""
+Assinatura do resultado via COPY (query) TO STDOUT.
+
+No caminho normal cada valor passa por três conversões: texto do
+protocolo -> objeto Python (Decimal, datetime...) por linha ->
+json.dumps(default=str) em rows_signature(). Aqui o resultado é
+transmitido por COPY direto para um hash incremental, em blocos de
+COPY_CHUNK bytes: nenhuma tupla Python é criada.
+
+- "text": o nº de linhas é o nº de '\\n' do stream (quebras de linha
+  dentro dos valores vêm escapadas como \\n);
+- "binary": mais barato para o servidor; o nº de linhas vem do status
+  do COPY. É mais estrito: int4 e int8 com o mesmo valor geram bytes
+  diferentes.
+
+A assinatura não é comparável com a de rows_signature(): original e
+reescrita precisam ser medidas do mesmo jeito.
+"""
+import hashlib
+
+COPY_CHUNK = 1 << 20   # 1 MiB
+
+
+class _HashSink:
+    """
+    "Arquivo" onde o copy_expert escreve: acumula em buffer e só chama
+    o hash (e conta as linhas) a cada chunk bytes.
+    """
+
+    def __init__(self, chunk: int = COPY_CHUNK):
+        self.hash = hashlib.md5()
+        self.buf = bytearray()
+        self.chunk = chunk
+        self.newlines = 0
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.buf += data
+        if len(self.buf) >= self.chunk:
+            self._flush()
+        return len(data)
+
+    def _flush(self):
+        self.newlines += self.buf.count(b"\n")
+        self.hash.update(self.buf)
+        self.buf.clear()
+
+    def hexdigest(self) -> str:
+        self._flush()
+        return self.hash.hexdigest()
+
+
+def copy_digest(conn, sql: str, fmt: str = "text", chunk: int = COPY_CHUNK):
+    """
+    (nº de linhas, assinatura) do resultado de sql, via COPY.
+    """
+    sql = sql.strip().rstrip(";")
+    options = " WITH (FORMAT binary)" if fmt == "binary" else ""
+    sink = _HashSink(chunk)
+    with conn.cursor() as cur:
+        cur.copy_expert(f"COPY ({sql}) TO STDOUT{options}", sink)
+        rowcount = cur.rowcount
+    signature = sink.hexdigest()
+    if fmt == "text":
+        rowcount = sink.newlines
+    return rowcount, signature
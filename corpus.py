@@ -0,0 +1,202 @@
+"""
+Corpus estruturado de queries (dbgpt_exp/queries.jsonl).
+
+read_queries() dos runners quebra queries.txt em "\n\n": uma query com
+linha em branco no meio se parte em duas, e um comentário '--' dentro
+da query vai parar no meio da SQL achatada numa linha só no CSV.
+
+Aqui cada linha do JSONL é uma query:
+
+    {"id": 1, "sql": "...", "tags": ["correlated-subquery", ...],
+     "ordered": true, "params": [], "notes": ["substitui o filtro impossível"]}
+
+- id: o mesmo query_id dos CSVs (posição em queries.txt);
+- sql: sem comentários (eles ficam em notes);
+- tags: categoria de anti-padrão, para rodar subconjuntos;
+- ordered: a query tem ORDER BY no nível externo (a ordem do resultado
+  faz parte da equivalência);
+- params / param_sql / param_types: templates com $1, $2, ... (ver
+  prepared.py); ficam fora da varredura normal.
+
+load_corpus() monta índices por id e por tag; corpus_from_text() converte
+o formato antigo (usado para gerar o queries.jsonl a partir do .txt).
+"""
+import os
+import re
+import json
+
+from sql_extract import tokenize
+
+CORPUS_FILE = os.path.join("dbgpt_exp", "queries.jsonl")
+
+# Heurísticas de anti-padrão usadas por auto_tags()
+_TAG_PATTERNS = [
+    ("in-subquery", re.compile(r"\bin\s*\(\s*select\b", re.I)),
+    ("not-in-subquery", re.compile(r"\bnot\s+in\s*\(\s*select\b", re.I)),
+    ("scalar-subquery-filter", re.compile(r"[<>=]\s*\(\s*select\b", re.I)),
+    ("subquery-in-order-by", re.compile(r"\border\s+by\s*\(\s*select\b", re.I)),
+    ("distinct", re.compile(r"\bdistinct\b", re.I)),
+    ("order-by-random", re.compile(r"\brandom\s*\(\s*\)", re.I)),
+    ("function-on-column", re.compile(
+        r"\b(extract|date_trunc|lower|upper)\s*\([^)]*\b\w+\.\w+", re.I)),
+    ("cte", re.compile(r"^\s*with\b", re.I)),
+    ("aggregation", re.compile(r"\bgroup\s+by\b", re.I)),
+    ("having", re.compile(r"\bhaving\b", re.I)),
+    ("left-join", re.compile(r"\bleft\s+join\b", re.I)),
+    ("limit", re.compile(r"\blimit\s+\d+", re.I)),
+]
+
+
+def strip_comments(sql: str):
+    """
+    Retorna (sql sem comentários, [comentários]).
+    """
+    parts, notes = [], []
+    for kind, text, _ in tokenize(sql):
+        if kind == "comment":
+            notes.append(text.lstrip("-").strip() if text.startswith("--")
+                         else text[2:-2].strip())
+            continue
+        parts.append(text)
+    cleaned = "".join(parts)
+    cleaned = re.sub(r"[ \t]+\n", "\n", cleaned)
+    return cleaned.strip(), notes
+
+
+def _top_level_order_by(sql: str) -> bool:
+    depth = 0
+    prev = None
+    for kind, text, _ in tokenize(sql):
+        if kind == "other" and text == "(":
+            depth += 1
+        elif kind == "other" and text == ")":
+            depth -= 1
+        elif kind == "word" and depth == 0:
+            if prev == "order" and text.lower() == "by":
+                return True
+            prev = text.lower()
+    return False
+
+
+def _subqueries(sql: str):
+    """
+    Trechos "(SELECT ...)" balanceados da query.
+    """
+    out = []
+    for m in re.finditer(r"\(\s*select\b", sql, re.I):
+        depth = 0
+        for j in range(m.start(), len(sql)):
+            if sql[j] == "(":
+                depth += 1
+            elif sql[j] == ")":
+                depth -= 1
+                if depth == 0:
+                    out.append(sql[m.start() + 1:j])
+                    break
+    return out
+
+
+def _is_correlated(sql: str) -> bool:
+    # Subquery que usa alias.coluna de um alias definido fora dela
+    for sub in _subqueries(sql):
+        defined = {m.group(1).lower() for m in re.finditer(
+            r"(?:from|join)\s+(?:\w+\.)?(?:\w+|\"\w+\")\s+(?:as\s+)?(\w+)", sub, re.I)}
+        used = {m.group(1).lower() for m in re.finditer(r"\b(\w+)\.\w+", sub)}
+        if used - defined - {"webshop"}:
+            return True
+    return False
+
+
+def auto_tags(sql: str):
+    tags = ["correlated-subquery"] if _is_correlated(sql) else []
+    return tags + [tag for tag, pattern in _TAG_PATTERNS if pattern.search(sql)]
+
+
+def corpus_from_text(path: str):
+    """
+    Converte o formato antigo (queries separadas por linha em branco) em
+    entradas do corpus, com ids na mesma ordem do read_queries().
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        blob = f.read().replace("\r\n", "\n")
+    blocks = [b.strip() for b in blob.split("\n\n")
+              if b.strip() and not b.strip().startswith("--")]
+    entries = []
+    for i, block in enumerate(blocks, start=1):
+        sql, notes = strip_comments(block)
+        entry = {
+            "id": i,
+            "sql": sql,
+            "tags": auto_tags(sql),
+            "ordered": _top_level_order_by(sql),
+            "params": [],
+        }
+        if notes:
+            entry["notes"] = notes
+        entries.append(entry)
+    return entries
+
+
+def write_corpus(path: str, entries):
+    with open(path, "w", encoding="utf-8") as f:
+        for e in entries:
+            f.write(json.dumps(e, ensure_ascii=False) + "\n")
+
+
+class Corpus:
+
+    def __init__(self, entries):
+        self.entries = sorted(entries, key=lambda e: e["id"])
+        self.by_id = {e["id"]: e for e in self.entries}
+        self.by_tag = {}
+        for e in self.entries:
+            for tag in e.get("tags", []):
+                self.by_tag.setdefault(tag, []).append(e)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, query_id):
+        return self.by_id[query_id]
+
+    def select(self, tags=None, ids=None):
+        """
+        Entradas com QUALQUER uma das tags e/ou com os ids pedidos, na
+        ordem do corpus. Sem filtros, o corpus inteiro.
+        """
+        if not tags and not ids:
+            return list(self.entries)
+        wanted = set(ids or [])
+        for tag in tags or []:
+            wanted.update(e["id"] for e in self.by_tag.get(tag, []))
+        return [e for e in self.entries if e["id"] in wanted]
+
+    def tags(self):
+        return {tag: len(es) for tag, es in sorted(self.by_tag.items())}
+
+
+def load_corpus(path: str = CORPUS_FILE):
+    """
+    Lê o queries.jsonl; se não existir, converte o queries.txt ao lado.
+    """
+    if not os.path.exists(path):
+        txt = os.path.splitext(path)[0] + ".txt"
+        return Corpus(corpus_from_text(txt))
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entries.append(json.loads(line))
+    return Corpus(entries)
+
+
+if __name__ == "__main__":
+    # Regenera o queries.jsonl a partir do queries.txt (sobrescreve
+    # tags editadas à mão); entradas que não vêm do .txt (ex.: templates
+    # parametrizados) são mantidas
+    entries = corpus_from_text(os.path.join("dbgpt_exp", "queries.txt"))
+    ids = {e["id"] for e in entries}
+    if os.path.exists(CORPUS_FILE):
+        entries += [e for e in load_corpus(CORPUS_FILE).entries if e["id"] not in ids]
+    write_corpus(CORPUS_FILE, entries)
+    print("Corpus gravado em:", CORPUS_FILE)
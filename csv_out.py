@@ -0,0 +1,25 @@
+"""
+Escrita dos CSVs de saída dos modos do runner.
+
+Todos seguem a mesma regra: o arquivo é aberto em append, para execuções
+com outros modelos, técnicas ou bancos se acumularem no mesmo CSV, e o
+cabeçalho só é escrito quando o arquivo ainda não existe.
+"""
+import os
+import csv
+
+
+def append_csv(path: str, header, rows):
+    """
+    Acrescenta rows em path, com header antes se o arquivo for novo.
+    Sem linhas, não faz nada (nem cria o arquivo).
+    """
+    rows = list(rows or [])
+    if not rows:
+        return
+    first_write = not os.path.exists(path)
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        if first_write:
+            w.writerow(header)
+        w.writerows(rows)
@@ -0,0 +1,155 @@
+"""
+Medição de energia por execução para queries curtas.
+
+O CodeCarbon amostra potência a cada ~1 s, então uma query de 10 ms medida
+uma única vez fica abaixo da resolução do amostrador. Aqui a query é
+repetida até preencher uma janela mínima, o consumo ocioso (baseline) é
+subtraído e o resultado é energia por execução, com desvio padrão entre
+janelas para servir de barra de erro.
+"""
+import math
+import time
+import logging
+import statistics
+
+from codecarbon import EmissionsTracker
+
+logging.getLogger("codecarbon").setLevel(logging.ERROR)
+
+# ===== CONFIG =====
+KWH_TO_J = 3.6e6
+MIN_WINDOW_SECS = 5.0   # duração mínima de cada janela de medição
+N_WINDOWS = 3           # janelas independentes -> desvio padrão
+
+ENERGY_HEADER = [
+    "joules_per_exec_original", "joules_std_original", "runs_original",
+    "joules_per_exec_rewritten", "joules_std_rewritten", "runs_rewritten",
+    "energy_ratio", "energy_saving_pct",
+]
+
+
+def _tracked(fn, project_name: str, output_dir: str):
+    """
+    Executa fn() dentro de um EmissionsTracker.
+    Retorna (resultado, emissões kgCO2e, energia J, duração s).
+    """
+    tracker = EmissionsTracker(
+        project_name=project_name,
+        output_dir=output_dir,
+        save_to_file=False,
+        log_level="error",
+        measure_power_secs=1,
+    )
+    tracker.start()
+    t0 = time.perf_counter()
+    try:
+        result = fn()
+    finally:
+        duration = time.perf_counter() - t0
+        emissions = tracker.stop()
+
+    data = getattr(tracker, "final_emissions_data", None)
+    energy_kwh = getattr(data, "energy_consumed", None)
+    energy_j = energy_kwh * KWH_TO_J if energy_kwh is not None else float("nan")
+    emissions = emissions if emissions is not None else float("nan")
+    return result, emissions, energy_j, duration
+
+
+def measure_idle_baseline(window_secs: float = MIN_WINDOW_SECS,
+                          project_name: str = "idle_baseline",
+                          output_dir: str = "."):
+    """
+    Mede o consumo da máquina parada (sleep) durante window_secs.
+    Retorna taxas (W e kgCO2e/s) para poder subtrair de janelas de qualquer
+    duração.
+    """
+    _, emissions, energy_j, duration = _tracked(
+        lambda: time.sleep(window_secs), project_name, output_dir
+    )
+    return {
+        "power_w": energy_j / duration,
+        "emissions_per_s": emissions / duration,
+        "window_secs": duration,
+    }
+
+
+def _loop_until(run_once, min_secs: float):
+    n = 0
+    t0 = time.perf_counter()
+    while True:
+        run_once()
+        n += 1
+        if time.perf_counter() - t0 >= min_secs:
+            return n
+
+
+def _mean_std(xs):
+    xs = [x for x in xs if not math.isnan(x)]
+    if not xs:
+        return float("nan"), float("nan")
+    if len(xs) == 1:
+        return xs[0], float("nan")
+    return statistics.mean(xs), statistics.stdev(xs)
+
+
+def measure_energy_per_execution(run_once,
+                                 baseline=None,
+                                 min_window_secs: float = MIN_WINDOW_SECS,
+                                 n_windows: int = N_WINDOWS,
+                                 project_name: str = "repeated",
+                                 output_dir: str = "."):
+    """
+    Repete run_once() até preencher min_window_secs, em n_windows janelas.
+
+    Em cada janela a energia ociosa (baseline["power_w"] * duração) é
+    subtraída e dividida pelo número de execuções. O retorno traz média e
+    desvio padrão entre janelas (J e kgCO2e por execução).
+    """
+    power_w = baseline["power_w"] if baseline else 0.0
+    em_rate = baseline["emissions_per_s"] if baseline else 0.0
+
+    joules = []
+    emissions = []
+    runs = 0
+    for k in range(n_windows):
+        n, em, energy_j, duration = _tracked(
+            lambda: _loop_until(run_once, min_window_secs),
+            f"{project_name}_w{k}",
+            output_dir,
+        )
+        runs += n
+        joules.append((energy_j - power_w * duration) / n)
+        emissions.append((em - em_rate * duration) / n)
+
+    j_mean, j_std = _mean_std(joules)
+    em_mean, em_std = _mean_std(emissions)
+    return {
+        "joules_per_exec": j_mean,
+        "joules_std": j_std,
+        "emissions_per_exec": em_mean,
+        "emissions_std": em_std,
+        "runs": runs,
+        "windows": n_windows,
+    }
+
+
+def energy_rows(en_orig, en_rew):
+    """
+    Linha do CSV de energia por execução (ENERGY_HEADER), numa lista:
+    J/execução ± desvio de cada variante e a razão entre elas.
+    """
+    nan = float("nan")
+    en_orig = en_orig or {}
+    en_rew = en_rew or {}
+    j_o = en_orig.get("joules_per_exec", nan)
+    j_r = en_rew.get("joules_per_exec", nan)
+
+    energy_ratio = nan
+    energy_saving_pct = nan
+    if j_o > 0.0 and j_r > 0.0:
+        energy_ratio = j_o / j_r
+        energy_saving_pct = (j_o - j_r) / j_o * 100.0
+
+    return [[j_o, en_orig.get("joules_std", nan), en_orig.get("runs", 0),
+             j_r, en_rew.get("joules_std", nan), en_rew.get("runs", 0),
+             energy_ratio, energy_saving_pct]]
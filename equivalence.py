@@ -0,0 +1,394 @@
+"""
+Teste diferencial de equivalência em mini-bancos aleatórios.
+
+same_rowcount / same_signature comparam original e reescrita num único
+dataset (o real): é caro (query inteira sobre os dados completos) e
+fraco (uma reescrita errada que por acaso bate nesses dados passa).
+
+Aqui cada instância é um mini-banco gerado no servidor: uma tabela
+temporária para cada tabela do schema (CREATE TEMP TABLE ... LIKE), com
+algumas centenas de linhas aleatórias. Tabelas temporárias ficam no
+schema pg_temp, que o Postgres procura antes do search_path, então as
+queries (sem schema) passam a ler o mini-banco. Casos de borda entram
+de propósito:
+
+- NULL em toda coluna que aceita NULL (NULL_FRACTION);
+- valores de domínio pequeno nas colunas não-id, com muitas duplicatas
+  e chaves de junção que casam;
+- instância 0 com todas as tabelas vazias, instância 1 com uma linha
+  por tabela e, nas demais, tabelas vazias sorteadas (EMPTY_FRACTION).
+
+Colunas "id" continuam únicas: reescritas que dependem de PK (eliminar
+join, trocar IN por JOIN) não são acusadas por duplicatas impossíveis.
+
+Tudo de uma instância roda numa transação que termina em ROLLBACK
+(funciona atrás de pooler em modo transação); as instâncias rodam em
+paralelo, uma conexão por thread. Uma instância que não pôde ser gerada
+(cast de enum, CHECK...) vira "skip" sem derrubar as outras.
+
+Os resultados são comparados como multiconjuntos ou, para queries
+ordered (corpus), como sequência de grupos de empate da chave do ORDER BY
+externo: linhas empatadas podem vir em qualquer ordem. Com domínios
+pequenos há muitos empates, então:
+
+- a chave precisa ser coluna de saída (alias, nome ou posição); se não
+  for, só dá para dizer "igual" ou "conteúdo diferente", e uma diferença
+  só de ordem vira "skip";
+- com LIMIT, a query roda de novo com LIMIT + 1: se a última linha empata
+  com a seguinte, quais linhas entram é arbitrário e a instância vira
+  "skip" (idem se a chave não for coluna de saída).
+
+Queries com random() não são determinísticas e divergem sempre.
+"""
+import random
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+import sqlglot
+from sqlglot import exp
+
+from sql_extract import tokenize
+
+DIFF_INSTANCES = 50
+DIFF_MAX_ROWS = 300
+DIFF_WORKERS = 8
+NULL_FRACTION = 0.1
+EMPTY_FRACTION = 0.1
+DIFF_SEED = 42
+
+EQUIVALENCE_HEADER = [
+    "instances", "agree", "disagree", "errors", "skipped", "equivalent",
+    "counterexample_instance", "counterexample_rows_original",
+    "counterexample_rows_rewritten", "counterexample_error",
+]
+
+COLUMNS_SQL = """
+SELECT c.relname, a.attname, format_type(a.atttypid, a.atttypmod),
+       t.typcategory, t.typtype = 'e', NOT a.attnotnull
+FROM pg_attribute a
+JOIN pg_class c ON c.oid = a.attrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+JOIN pg_type t ON t.oid = a.atttypid
+WHERE n.nspname = %s AND c.relkind = 'r' AND a.attnum > 0 AND NOT a.attisdropped
+ORDER BY c.relname, a.attnum
+"""
+
+
+def load_schema(conn, schema: str = "webshop"):
+    """
+    {tabela: [(coluna, tipo, categoria, é_enum, aceita_null)]}.
+    """
+    tables = {}
+    with conn.cursor() as cur:
+        cur.execute(COLUMNS_SQL, (schema,))
+        for rel, col, typ, cat, is_enum, nullable in cur.fetchall():
+            tables.setdefault(rel, []).append((col, typ, cat, is_enum, nullable))
+    return tables
+
+
+def _value_expr(col, typ, cat, is_enum, nullable, domain):
+    """
+    Expressão SQL (sobre a série g) que gera valores da coluna.
+    """
+    if col == "id":
+        return "g"
+    if is_enum:
+        expr = (f"(enum_range(NULL::{typ}))[1 + floor(random() * "
+                f"cardinality(enum_range(NULL::{typ})))::int]")
+    elif cat == "N":
+        if typ in ("integer", "bigint", "smallint"):
+            expr = f"(1 + floor(random() * {domain}))::{typ}"
+        else:
+            expr = f"round((random() * 100)::numeric, 2)::{typ}"
+    elif cat == "D":
+        expr = (f"(timestamp '2019-06-01' + floor(random() * {domain}) "
+                f"* interval '37 days')::{typ}")
+    elif cat == "B":
+        expr = "random() < 0.5"
+    elif cat == "S":
+        expr = (f"(ARRAY['a', 'b', 'B', '', 'x y'])"
+                f"[1 + floor(random() * 5)::int]::{typ}")
+    else:
+        return "NULL" if nullable else None
+    if nullable:
+        expr = f"CASE WHEN random() < {NULL_FRACTION} THEN NULL ELSE {expr} END"
+    return expr
+
+
+def _unqualify(sql: str, schema: str = "webshop") -> str:
+    """
+    Remove o prefixo "webshop." para a query ler as tabelas temporárias.
+    """
+    toks = list(tokenize(sql))
+    out, skip_dot = [], False
+    for n, (kind, text, _) in enumerate(toks):
+        if skip_dot:
+            skip_dot = False
+            continue
+        if (kind in ("word", "quoted") and text.strip('"').lower() == schema
+                and n + 1 < len(toks) and toks[n + 1][1] == "."):
+            skip_dot = True
+            continue
+        out.append(text)
+    return "".join(out)
+
+
+def instance_sizes(tables, n: int, max_rows: int = DIFF_MAX_ROWS):
+    """
+    {tabela: nº de linhas} da instância n (reprodutível).
+    """
+    if n == 0:
+        return {t: 0 for t in tables}
+    if n == 1:
+        return {t: 1 for t in tables}
+    rng = random.Random(DIFF_SEED * 1000 + n)
+    return {t: 0 if rng.random() < EMPTY_FRACTION else rng.randint(2, max_rows)
+            for t in tables}
+
+
+def build_instance(cur, tables, sizes, seed: float, schema: str = "webshop"):
+    cur.execute("SELECT setseed(%s)", (seed,))
+    for rel, cols in tables.items():
+        cur.execute(f'CREATE TEMP TABLE "{rel}" (LIKE "{schema}"."{rel}" INCLUDING DEFAULTS) '
+                    "ON COMMIT DROP")
+        if not sizes[rel]:
+            continue
+        domain = max(2, sizes[rel] // 3)
+        names, exprs = [], []
+        for col, typ, cat, is_enum, nullable in cols:
+            expr = _value_expr(col, typ, cat, is_enum, nullable, domain)
+            if expr is not None:
+                names.append(f'"{col}"')
+                exprs.append(expr)
+        cur.execute(f'INSERT INTO "{rel}" ({", ".join(names)}) '
+                    f'SELECT {", ".join(exprs)} FROM generate_series(1, {sizes[rel]}) AS g')
+    cur.execute("ANALYZE " + ", ".join(f'"{t}"' for t in tables))
+
+
+def _error_line(e) -> str:
+    return str(e).strip().splitlines()[0] if str(e).strip() else type(e).__name__
+
+
+def _run(cur, sql: str):
+    """
+    (linhas, None) ou (None, mensagem de erro). Usa savepoint para um
+    erro não abortar a transação da instância.
+    """
+    cur.execute("SAVEPOINT q")
+    try:
+        cur.execute(sql)
+        rows = cur.fetchall() if cur.description else []
+        cur.execute("RELEASE SAVEPOINT q")
+        return rows, None
+    except psycopg2.Error as e:
+        cur.execute("ROLLBACK TO SAVEPOINT q")
+        return None, _error_line(e)
+
+
+def order_spec(sql: str):
+    """
+    Ordenação externa da query: {"keys": índices das colunas de saída da
+    chave do ORDER BY (None se alguma parte não for coluna de saída),
+    "limit": int, None (sem LIMIT) ou "?" (LIMIT não literal/FETCH),
+    "probe": a SQL com LIMIT + 1}. None se não há ORDER BY ou o sqlglot
+    não parseia.
+    """
+    try:
+        tree = sqlglot.parse_one(sql, read="postgres")
+    except Exception:
+        return None
+    order = tree.args.get("order")
+    if order is None:
+        return None
+
+    selects = tree.selects
+    keys = [] if not any(p.is_star for p in selects) else None
+    for ordered in order.expressions if keys is not None else []:
+        key = ordered.this
+        idx = None
+        if isinstance(key, exp.Literal) and not key.is_string and key.this.isdigit():
+            n = int(key.this) - 1
+            idx = n if 0 <= n < len(selects) else None
+        else:
+            if isinstance(key, exp.Column) and not key.table:
+                # nome solto: coluna de saída tem precedência no Postgres
+                idx = next((j for j, p in enumerate(selects)
+                            if p.alias_or_name == key.name), None)
+            if idx is None:
+                idx = next((j for j, p in enumerate(selects) if p.unalias() == key), None)
+        if idx is None:
+            keys = None
+            break
+        keys.append(idx)
+
+    limit, probe = None, None
+    node = tree.args.get("limit")
+    if node is not None:
+        value = node.expression if isinstance(node, exp.Limit) else None
+        if isinstance(value, exp.Literal) and not value.is_string and value.this.isdigit():
+            limit = int(value.this)
+            wider = tree.copy()
+            wider.set("limit", exp.Limit(expression=exp.Literal.number(limit + 1)))
+            probe = wider.sql(dialect="postgres")
+        else:
+            limit = "?"
+    return {"keys": keys, "limit": limit, "probe": probe}
+
+
+def _tie_groups(rows, keys):
+    """
+    Sequência de (chave, multiconjunto das linhas com essa chave), na
+    ordem do resultado.
+    """
+    groups = []
+    for r in rows:
+        k = repr(tuple(r[j] for j in keys))
+        if groups and groups[-1][0] == k:
+            groups[-1][1][repr(r)] += 1
+        else:
+            groups.append((k, Counter([repr(r)])))
+    return groups
+
+
+def _limit_is_arbitrary(cur, spec, rows) -> bool:
+    """
+    True se, com LIMIT, a última linha do resultado empata com a primeira
+    que ficou de fora (ou não dá para saber).
+    """
+    if spec["limit"] is None:
+        return False
+    if spec["limit"] == "?" or spec["keys"] is None:
+        return True
+    if len(rows) < spec["limit"]:
+        return False   # o LIMIT não cortou nada
+    wider, err = _run(cur, spec["probe"])
+    if err or len(wider) <= spec["limit"]:
+        return err is not None
+    last, nxt = wider[spec["limit"] - 1], wider[spec["limit"]]
+    return all(last[j] == nxt[j] for j in spec["keys"])
+
+
+def compare_results(cur, original: str, rewritten: str, ro, rr, ordered: bool):
+    """
+    "agree", "disagree" ou "skip" (a ordem/escolha das linhas empatadas
+    torna a comparação indecidível nesta instância).
+    """
+    same_content = Counter(map(repr, ro)) == Counter(map(repr, rr))
+    if not ordered:
+        return "agree" if same_content else "disagree"
+
+    so, sr = order_spec(original), order_spec(rewritten)
+    if so is None or sr is None:
+        # uma das duas sem ORDER BY (ou não parseia): compara a sequência
+        if ro == rr:
+            return "agree"
+        return "disagree" if not same_content else "skip"
+
+    if _limit_is_arbitrary(cur, so, ro) or _limit_is_arbitrary(cur, sr, rr):
+        return "skip"
+    if so["keys"] is None or sr["keys"] is None:
+        if ro == rr:
+            return "agree"
+        return "disagree" if not same_content else "skip"
+    return "agree" if _tie_groups(ro, so["keys"]) == _tie_groups(rr, sr["keys"]) \
+        else "disagree"
+
+
+def check_instance(dsn: str, tables, original: str, rewritten: str, n: int,
+                   max_rows: int = DIFF_MAX_ROWS, schema: str = "webshop",
+                   ordered: bool = False):
+    """
+    Gera a instância n e compara as duas queries nela.
+    Retorna {instance, status, rows_original, rows_rewritten, error}, com
+    status "agree", "disagree", "error" (só uma falhou) ou "skip" (as
+    duas falharam, ex.: subquery escalar com mais de uma linha; a
+    instância não pôde ser gerada; ou empates tornam a ordem indecidível).
+    """
+    ro = rr = eo = er = None
+    status = None
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            try:
+                build_instance(cur, tables, instance_sizes(tables, n, max_rows),
+                               ((DIFF_SEED + n) % 1000) / 1000.0, schema)
+            except psycopg2.Error as e:
+                status, eo = "skip", "instância: " + _error_line(e)
+            else:
+                ro, eo = _run(cur, original)
+                rr, er = _run(cur, rewritten)
+                if not (eo or er):
+                    status = compare_results(cur, original, rewritten, ro, rr, ordered)
+        conn.rollback()
+    finally:
+        conn.close()
+
+    if status is None:
+        status = "skip" if eo and er else "error"
+    return {
+        "instance": n,
+        "status": status,
+        "rows_original": len(ro) if ro is not None else None,
+        "rows_rewritten": len(rr) if rr is not None else None,
+        "error": eo or er or "",
+    }
+
+
+def differential_check(dsn: str, original: str, rewritten: str,
+                       instances: int = DIFF_INSTANCES, max_rows: int = DIFF_MAX_ROWS,
+                       workers: int = DIFF_WORKERS, schema: str = "webshop",
+                       ordered: bool = False):
+    """
+    Roda as instâncias em paralelo. ordered: a ordem do resultado faz
+    parte da equivalência (campo "ordered" do corpus). Retorna
+    {instances, agree, disagree, errors, skipped, equivalent,
+    counterexample} (counterexample: a primeira instância que diverge,
+    ou None).
+    """
+    conn = psycopg2.connect(dsn)
+    try:
+        tables = load_schema(conn, schema)
+    finally:
+        conn.close()
+
+    original, rewritten = _unqualify(original, schema), _unqualify(rewritten, schema)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(
+            lambda n: check_instance(dsn, tables, original, rewritten, n,
+                                     max_rows, schema, ordered),
+            range(instances)))
+
+    by_status = Counter(r["status"] for r in results)
+    bad = [r for r in results if r["status"] in ("disagree", "error")]
+    return {
+        "instances": instances,
+        "agree": by_status["agree"],
+        "disagree": by_status["disagree"],
+        "errors": by_status["error"],
+        "skipped": by_status["skip"],
+        "equivalent": not bad and by_status["agree"] > 0,
+        "counterexample": bad[0] if bad else None,
+    }
+
+
+def equivalence_rows(dsn: str, original: str, rewritten: str,
+                     instances: int = DIFF_INSTANCES, ordered: bool = False,
+                     label: str = ""):
+    """
+    Linha do CSV de equivalência diferencial (EQUIVALENCE_HEADER), numa
+    lista; lista vazia se a checagem não rodou.
+    """
+    try:
+        r = differential_check(dsn, original, rewritten, instances, ordered=ordered)
+    except Exception as e:
+        print("Erro na equivalência diferencial:", e)
+        return []
+    ce = r["counterexample"] or {}
+    print(f"[{label}] mini-bancos: {r['agree']}/{r['instances']} iguais, "
+          f"{r['disagree']} diferentes, {r['errors']} com erro"
+          + (f" (contraexemplo: instância {ce['instance']})" if ce else ""))
+    return [[r["instances"], r["agree"], r["disagree"], r["errors"], r["skipped"],
+             r["equivalent"], ce.get("instance", ""),
+             ce.get("rows_original", ""), ce.get("rows_rewritten", ""),
+             ce.get("error", "")]]
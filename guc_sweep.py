@@ -0,0 +1,173 @@
+"""
+Varredura de configurações do planejador (GUCs) para original x reescrita.
+
+Cada par é medido de novo sob uma matriz de configurações de sessão
+(work_mem, jit, paralelismo, random_page_cost, enable_*...). Com isso dá
+para ver:
+- reescritas que só ganham em certas configurações;
+- configurações que sozinhas (só a original, sem reescrever) já chegam
+  ao speedup da reescrita na configuração padrão.
+
+As configurações são aplicadas com set_config(..., is_local => true)
+dentro de uma transação que termina em ROLLBACK: valem só para aquela
+medição e funcionam atrás de um pooler em modo transação (Neon/pgbouncer),
+sem vazar para a próxima sessão que pegar a conexão.
+
+O tempo usado é o Execution Time do EXPLAIN ANALYZE (mediana de runs).
+"""
+import itertools
+import statistics
+
+import psycopg2
+
+# Alternativas para cada GUC; o padrão do servidor é sempre incluído
+GUC_OPTIONS = {
+    "work_mem": ["64MB"],
+    "jit": ["off"],
+    "max_parallel_workers_per_gather": ["0"],
+    "random_page_cost": ["1.1"],
+    "enable_hashjoin": ["off"],
+    "enable_nestloop": ["off"],
+}
+
+SWEEP_RUNS = 3
+WIN_MARGIN = 1.05     # speedup acima disso = reescrita ganha
+MATCH_TOLERANCE = 0.9  # config "empata" se chegar a 90% do speedup
+
+SWEEP_FIELDS = ["config", "settings", "original_ms", "rewritten_ms",
+                "speedup", "config_alone_speedup"]
+
+
+def one_at_a_time(options=None):
+    """
+    [("default", {})] + uma configuração por valor alternativo de cada GUC.
+    """
+    options = GUC_OPTIONS if options is None else options
+    configs = [("default", {})]
+    for guc, values in options.items():
+        for v in values:
+            configs.append((f"{guc}={v}", {guc: v}))
+    return configs
+
+
+def full_product(options=None):
+    """
+    Produto cartesiano (padrão ou alternativa) de todas as GUCs. Cresce
+    rápido: 6 GUCs com 1 alternativa = 64 configurações.
+    """
+    options = GUC_OPTIONS if options is None else options
+    gucs = list(options)
+    choices = [[None] + list(options[g]) for g in gucs]
+    configs = []
+    for combo in itertools.product(*choices):
+        settings = {g: v for g, v in zip(gucs, combo) if v is not None}
+        name = ",".join(f"{g}={v}" for g, v in settings.items()) or "default"
+        configs.append((name, settings))
+    return configs
+
+
+def explain_under(conn, sql: str, settings, runs: int = SWEEP_RUNS):
+    """
+    EXPLAIN ANALYZE de sql com settings locais à transação, runs vezes.
+    Retorna (mediana do Execution Time, JSON do último EXPLAIN).
+    """
+    times = []
+    data = None
+    for _ in range(runs):
+        try:
+            with conn.cursor() as cur:
+                for guc, value in settings.items():
+                    cur.execute("SELECT set_config(%s, %s, true)", (guc, str(value)))
+                cur.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + sql)
+                data = cur.fetchall()[0][0][0]
+                times.append(data.get("Execution Time"))
+        finally:
+            conn.rollback()
+    times = [t for t in times if t is not None]
+    return (statistics.median(times) if times else float("nan")), data
+
+
+def explain_ms_under(conn, sql: str, settings, runs: int = SWEEP_RUNS):
+    """
+    Mediana do Execution Time de sql com settings locais à transação.
+    """
+    return explain_under(conn, sql, settings, runs)[0]
+
+
+def sweep_pair(dsn: str, original: str, rewritten: str, configs=None,
+               runs: int = SWEEP_RUNS):
+    """
+    Mede o par em cada configuração. Retorna lista de dicts (SWEEP_FIELDS).
+    config_alone_speedup = original(default) / original(config): quanto a
+    configuração sozinha acelera a original.
+    """
+    configs = one_at_a_time() if configs is None else configs
+    conn = psycopg2.connect(dsn)
+    rows = []
+    try:
+        for name, settings in configs:
+            o = explain_ms_under(conn, original, settings, runs)
+            r = explain_ms_under(conn, rewritten, settings, runs)
+            rows.append({
+                "config": name,
+                "settings": ";".join(f"{g}={v}" for g, v in settings.items()),
+                "original_ms": o,
+                "rewritten_ms": r,
+                "speedup": o / r if r and r == r and o == o else float("nan"),
+            })
+    finally:
+        conn.close()
+
+    base = next((x["original_ms"] for x in rows if x["config"] == "default"), float("nan"))
+    for x in rows:
+        o = x["original_ms"]
+        x["config_alone_speedup"] = base / o if o and o == o and base == base else float("nan")
+    return rows
+
+
+def summarize_sweep(rows):
+    """
+    {default_speedup, wins_in, loses_in, config_only_wins, config_matches}
+    - config_only_wins: a reescrita ganha aqui mas não no default;
+    - config_matches: configurações que sozinhas chegam ao speedup da
+      reescrita no default.
+    """
+    default = next((x for x in rows if x["config"] == "default"), None)
+    d_speed = default["speedup"] if default else float("nan")
+    wins = [x["config"] for x in rows if x["speedup"] == x["speedup"] and x["speedup"] > WIN_MARGIN]
+    loses = [x["config"] for x in rows if x["speedup"] == x["speedup"] and x["speedup"] < 1 / WIN_MARGIN]
+    default_wins = d_speed == d_speed and d_speed > WIN_MARGIN
+    matches = []
+    if default_wins:
+        matches = [x["config"] for x in rows
+                   if x["config"] != "default"
+                   and x["config_alone_speedup"] >= d_speed * MATCH_TOLERANCE]
+    return {
+        "default_speedup": d_speed,
+        "wins_in": wins,
+        "loses_in": loses,
+        "config_only_wins": [] if default_wins else wins,
+        "config_matches": matches,
+    }
+
+
+def guc_sweep_rows(dsn: str, original: str, rewritten: str, configs=None,
+                   label: str = ""):
+    """
+    Linhas do CSV da varredura (SWEEP_FIELDS), 1 por configuração, e
+    imprime em quais configurações a reescrita ganha/perde.
+    """
+    try:
+        results = sweep_pair(dsn, original, rewritten, configs)
+    except Exception as e:
+        print("Erro na varredura de GUCs:", e)
+        return []
+
+    summary = summarize_sweep(results)
+    print(f"[{label}] GUCs: speedup default={summary['default_speedup']:.3f}; "
+          f"ganha em {len(summary['wins_in'])}/{len(results)}")
+    if summary["config_only_wins"]:
+        print("  só ganha com:", ", ".join(summary["config_only_wins"]))
+    if summary["config_matches"]:
+        print("  a config sozinha já empata:", ", ".join(summary["config_matches"]))
+    return [[r[k] for k in SWEEP_FIELDS] for r in results]
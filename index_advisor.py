@@ -0,0 +1,210 @@
+"""
+Advisor de índices para a carga inteira (todas as queries do corpus e,
+opcionalmente, as melhores reescritas já medidas).
+
+Avaliar índices query a query (indexes.py) ignora que um índice serve a
+várias queries. Aqui:
+
+1. os candidatos são a união dos candidatos dos planos de cada query;
+2. cada configuração (conjunto de índices) é custeada com EXPLAIN sobre
+   índices hipotéticos (HypoPG): custo da carga = soma do Total Cost;
+3. a seleção é gulosa: a cada passo entra o candidato com maior redução
+   de custo por MB (tamanho estimado pelo hypopg_relation_size), até
+   acabar o orçamento de armazenamento ou nenhum candidato ajudar.
+
+Os custos de cada (query, configuração) vão para um MeasurementCache,
+chaveado pelo snapshot do banco: rodar de novo com outro orçamento, ou
+com as reescritas incluídas, só custeia o que faltar.
+"""
+import csv
+import glob
+
+import psycopg2
+
+from indexes import (plan_of, candidate_indexes, create_hypothetical,
+                     reset_hypothetical, has_hypopg, index_label, index_ddl)
+from measure_cache import measurement_key
+from csv_out import append_csv
+
+ADVISOR_BUDGET_MB = 64.0
+MIN_GAIN_PCT = 0.5    # passo que reduz menos que isso (% da carga) encerra
+
+ADVISOR_FIELDS = ["step", "index", "ddl", "size_mb", "total_size_mb",
+                  "workload_cost", "gain", "gain_pct", "queries_improved"]
+
+
+# Cabeçalho antigo do test_GPT/test_Mistral/test_LLAMA: as linhas sempre
+# foram gravadas como speedup, buffers_ratio, emissions_original,
+# emissions_rewritten, mas o cabeçalho listava as emissões primeiro.
+LEGACY_SWAPPED_COLUMNS = ["emissions_original", "emissions_rewritten",
+                          "speedup", "buffers_ratio"]
+
+
+def speedup_column(fields):
+    """
+    Posição do speedup numa linha de resultados com este cabeçalho (None
+    se não houver). Em CSVs com o cabeçalho antigo o valor está na
+    posição rotulada emissions_original.
+    """
+    n = len(LEGACY_SWAPPED_COLUMNS)
+    for k in range(len(fields) - n + 1):
+        if fields[k:k + n] == LEGACY_SWAPPED_COLUMNS:
+            return k
+    return fields.index("speedup") if "speedup" in fields else None
+
+
+def best_rewrites(pattern: str):
+    """
+    {query_id: reescrita de maior speedup com same_signature = True},
+    entre todos os CSVs de resultados que casam com pattern.
+    """
+    best = {}
+    for path in sorted(glob.glob(pattern)):
+        with open(path, "r", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            fields = next(reader, [])
+            needed = ("query_id", "same_signature", "rewritten_sql")
+            if not all(c in fields for c in needed):
+                continue   # CSV sem cabeçalho
+            i_qid, i_sig, i_sql = (fields.index(c) for c in needed)
+            i_speedup = speedup_column(fields)
+            if i_speedup is None:
+                continue
+            for row in reader:
+                if len(row) != len(fields):
+                    continue
+                if row[i_sig] != "True" or not row[i_sql]:
+                    continue
+                try:
+                    qid, speedup = int(row[i_qid]), float(row[i_speedup])
+                except ValueError:
+                    continue
+                if speedup == speedup and speedup > best.get(qid, (0.0, ""))[0]:
+                    best[qid] = (speedup, row[i_sql])
+    return {qid: sql for qid, (_, sql) in best.items()}
+
+
+def enumerate_candidates(conn, workload):
+    cands = []
+    for label, sql in workload:
+        try:
+            plan = plan_of(conn, sql)
+        except Exception as e:
+            print(f"[advisor] EXPLAIN falhou em {label}:", e)
+            continue
+        for cand in candidate_indexes(plan):
+            if cand not in cands:
+                cands.append(cand)
+    return cands
+
+
+def candidate_size(conn, cand) -> int:
+    """
+    Tamanho estimado (bytes) do índice, sem construí-lo.
+    """
+    oid = create_hypothetical(conn, [cand])[cand]
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT hypopg_relation_size(%s)", (oid,))
+            return cur.fetchone()[0]
+    finally:
+        reset_hypothetical(conn)
+
+
+def query_costs(conn, workload, config, cache=None, db: str = "", snapshot: str = ""):
+    """
+    {label: Total Cost} de cada query com os índices hipotéticos de config.
+    Queries que não planejam ficam fora do dicionário.
+    """
+    mode = "hypo:" + "|".join(sorted(index_label(c) for c in config))
+    costs, missing = {}, []
+    for label, sql in workload:
+        hit = cache.get(measurement_key(db, sql, mode, snapshot)) if cache else None
+        if hit is not None:
+            costs[label] = hit
+        else:
+            missing.append((label, sql))
+    if not missing:
+        return costs
+
+    if config:
+        create_hypothetical(conn, config)
+    try:
+        for label, sql in missing:
+            try:
+                costs[label] = plan_of(conn, sql)["Total Cost"]
+            except Exception:
+                continue
+            if cache:
+                cache.put(measurement_key(db, sql, mode, snapshot), costs[label])
+    finally:
+        if config:
+            reset_hypothetical(conn)
+    return costs
+
+
+def advise(dsn: str, workload, budget_mb: float = ADVISOR_BUDGET_MB,
+           cache=None, db: str = "", snapshot: str = ""):
+    """
+    Seleção gulosa sob orçamento. workload: [(label, sql)].
+    Retorna (custo da carga sem índices novos, [passos (ADVISOR_FIELDS)]).
+    """
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    try:
+        if not has_hypopg(conn):
+            raise RuntimeError("extensão hypopg não instalada (CREATE EXTENSION hypopg)")
+
+        cands = enumerate_candidates(conn, workload)
+        sizes = {c: candidate_size(conn, c) / (1024.0 * 1024.0) for c in cands}
+        print(f"[advisor] {len(workload)} queries, {len(cands)} candidatos")
+
+        current = query_costs(conn, workload, [], cache, db, snapshot)
+        base_total = sum(current.values())
+        total = base_total
+        chosen, used, steps = [], 0.0, []
+
+        while True:
+            best = None
+            for c in cands:
+                if c in chosen or used + sizes[c] > budget_mb:
+                    continue
+                costs = query_costs(conn, workload, chosen + [c], cache, db, snapshot)
+                # só compara queries que planejaram nas duas configurações
+                gain = sum(current[k] - costs[k] for k in current if k in costs)
+                ratio = gain / max(sizes[c], 1e-3)
+                if gain > 0 and (best is None or ratio > best[0]):
+                    best = (ratio, c, gain, costs)
+            if best is None:
+                break
+            _, c, gain, costs = best
+            gain_pct = gain / total * 100.0 if total else 0.0
+            if gain_pct < MIN_GAIN_PCT:
+                break
+
+            improved = [k for k in current if k in costs and costs[k] < current[k] * 0.99]
+            chosen.append(c)
+            used += sizes[c]
+            total -= gain
+            current = costs
+            steps.append({
+                "step": len(chosen),
+                "index": index_label(c),
+                "ddl": index_ddl(c),
+                "size_mb": sizes[c],
+                "total_size_mb": used,
+                "workload_cost": total,
+                "gain": gain,
+                "gain_pct": gain_pct,
+                "queries_improved": ";".join(improved),
+            })
+            print(f"[advisor] +{index_label(c)} ({sizes[c]:.1f} MB): "
+                  f"-{gain_pct:.1f}% no custo da carga")
+    finally:
+        conn.close()
+    return base_total, steps
+
+
+def write_advice(path: str, db: str, base_total: float, steps):
+    append_csv(path, ["db", "base_cost"] + ADVISOR_FIELDS,
+               [[db, base_total] + [s[k] for k in ADVISOR_FIELDS] for s in steps])
@@ -0,0 +1,254 @@
+"""
+Índices candidatos e avaliação "reescrita x índice x ambos".
+
+Boa parte dos ganhos das reescritas vem de contornar um índice que falta
+(ex.: a query 1 faz lookups correlacionados em "order".customer que caem
+em Seq Scan). Aqui os candidatos saem do próprio plano:
+
+- colunas do Filter de cada Seq Scan (da relação escaneada);
+- chaves de junção (Hash Cond / Merge Cond / Join Filter), dos dois lados.
+
+Cada par é avaliado em quatro variantes: original, rewritten,
+original+index e rewritten+index (o mesmo conjunto de índices, tirado dos
+planos das duas). Dois modos:
+
+- "hypopg": índices hipotéticos (extensão HypoPG), só custo do
+  planejador (Total Cost), sem criar nada;
+- "real": CREATE INDEX de verdade, EXPLAIN ANALYZE e DROP INDEX no fim.
+  Use só num Postgres local (trava escrita nas tabelas durante o build).
+"""
+import re
+import uuid
+import statistics
+
+import psycopg2
+
+INDEX_MODES = ("hypopg", "real")
+INDEX_RUNS = 3
+MAX_INDEX_COLUMNS = 2
+TMP_INDEX_PREFIX = "tmp_idx_"
+
+VARIANTS = ("original", "rewritten", "original+index", "rewritten+index")
+INDEX_FIELDS = ["variant", "indexes", "total_cost", "execution_ms"]
+INDEX_HEADER = ["index_mode"] + INDEX_FIELDS + ["verdict"]
+
+_JOIN_KEYS = ("Hash Cond", "Merge Cond", "Join Filter")
+_QUALIFIED_RE = re.compile(r'(?:"([^"]+)"|\b([A-Za-z_]\w*))\.(?:"([^"]+)"|([A-Za-z_]\w*)\b)')
+
+
+def _walk(plan):
+    yield plan
+    for child in plan.get("Plans", []) or []:
+        yield from _walk(child)
+
+
+def _qualified_columns(expr: str):
+    """
+    [(alias, coluna)] na ordem em que aparecem em expr.
+    """
+    return [(m.group(1) or m.group(2), m.group(3) or m.group(4))
+            for m in _QUALIFIED_RE.finditer(expr or "")]
+
+
+def plan_of(conn, sql: str):
+    """
+    Nó raiz do EXPLAIN (VERBOSE, FORMAT JSON): com VERBOSE as colunas
+    vêm qualificadas pelo alias e os nós trazem o schema.
+    """
+    with conn.cursor() as cur:
+        cur.execute("EXPLAIN (VERBOSE, FORMAT JSON) " + sql)
+        return cur.fetchall()[0][0][0]["Plan"]
+
+
+def candidate_indexes(plan):
+    """
+    Candidatos do plano: [(schema, tabela, (colunas...))], sem repetição.
+    """
+    aliases = {}
+    for node in _walk(plan):
+        if node.get("Relation Name"):
+            aliases[node.get("Alias", node["Relation Name"])] = (
+                node.get("Schema", "public"), node["Relation Name"])
+
+    out = []
+
+    def add(table, cols):
+        cols = tuple(dict.fromkeys(cols))[:MAX_INDEX_COLUMNS]
+        cand = table + (cols,)
+        if cols and cand not in out:
+            out.append(cand)
+
+    for node in _walk(plan):
+        if node.get("Node Type") == "Seq Scan" and node.get("Filter"):
+            alias = node.get("Alias", node.get("Relation Name"))
+            cols = [c for a, c in _qualified_columns(node["Filter"]) if a == alias]
+            for c in cols:
+                add(aliases[alias], [c])
+            if len(set(cols)) > 1:
+                add(aliases[alias], cols)
+        for key in _JOIN_KEYS:
+            for a, c in _qualified_columns(node.get(key)):
+                if a in aliases:
+                    add(aliases[a], [c])
+    return out
+
+
+def index_ddl(cand, name=None) -> str:
+    schema, table, cols = cand
+    name = f" {name}" if name else ""
+    return (f'CREATE INDEX{name} ON "{schema}"."{table}" ('
+            + ", ".join(f'"{c}"' for c in cols) + ")")
+
+
+def index_label(cand) -> str:
+    schema, table, cols = cand
+    return f"{schema}.{table}({','.join(cols)})"
+
+
+def has_hypopg(conn) -> bool:
+    with conn.cursor() as cur:
+        cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'hypopg'")
+        return cur.fetchone() is not None
+
+
+def create_hypothetical(conn, cands):
+    """
+    Cria os índices hipotéticos (valem só nesta conexão).
+    Retorna {candidato: indexrelid}.
+    """
+    oids = {}
+    with conn.cursor() as cur:
+        for cand in cands:
+            cur.execute("SELECT indexrelid FROM hypopg_create_index(%s)",
+                        (index_ddl(cand),))
+            oids[cand] = cur.fetchone()[0]
+    return oids
+
+
+def reset_hypothetical(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT hypopg_reset()")
+
+
+def create_real(conn, cands, names):
+    """
+    CREATE INDEX de cada candidato. Cada índice entra em names assim que
+    é criado, para o drop_real do chamador ver o progresso parcial se um
+    CREATE falhar. Sem ANALYZE: um índice novo não precisa de estatísticas
+    e o ANALYZE mudaria as do resto da varredura.
+
+    Os nomes levam um sufixo único por chamada: outra thread, alvo ou
+    processo avaliando ao mesmo tempo nunca usa o mesmo nome, e nada além
+    do que está em names é removido.
+    """
+    run = uuid.uuid4().hex[:12]
+    with conn.cursor() as cur:
+        for n, cand in enumerate(cands):
+            name = f"{TMP_INDEX_PREFIX}{run}_{n}"
+            cur.execute(index_ddl(cand, name))
+            names.append((cand[0], name))
+    return names
+
+
+def drop_real(conn, names):
+    with conn.cursor() as cur:
+        for schema, name in names:
+            cur.execute(f'DROP INDEX IF EXISTS "{schema}".{name}')
+
+
+def plan_cost(conn, sql: str, analyze: bool = False, runs: int = INDEX_RUNS):
+    """
+    (Total Cost estimado, mediana do Execution Time). Sem analyze o
+    tempo é NaN (índices hipotéticos não podem ser executados).
+    """
+    if not analyze:
+        return plan_of(conn, sql)["Total Cost"], float("nan")
+    times, cost = [], float("nan")
+    with conn.cursor() as cur:
+        for _ in range(runs):
+            cur.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + sql)
+            data = cur.fetchall()[0][0][0]
+            cost = data["Plan"]["Total Cost"]
+            times.append(data.get("Execution Time"))
+    times = [t for t in times if t is not None]
+    return cost, (statistics.median(times) if times else float("nan"))
+
+
+def evaluate_with_indexes(dsn: str, original: str, rewritten: str,
+                          mode: str = "hypopg", runs: int = INDEX_RUNS):
+    """
+    Mede as quatro VARIANTS. Retorna lista de dicts (INDEX_FIELDS).
+    """
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    analyze = mode == "real"
+    try:
+        if mode == "hypopg" and not has_hypopg(conn):
+            raise RuntimeError("extensão hypopg não instalada (CREATE EXTENSION hypopg)")
+
+        cands = []
+        for sql in (original, rewritten):
+            for cand in candidate_indexes(plan_of(conn, sql)):
+                if cand not in cands:
+                    cands.append(cand)
+        labels = ";".join(index_label(c) for c in cands)
+
+        rows = []
+        for variant, sql in (("original", original), ("rewritten", rewritten)):
+            cost, ms = plan_cost(conn, sql, analyze, runs)
+            rows.append({"variant": variant, "indexes": "",
+                         "total_cost": cost, "execution_ms": ms})
+
+        if cands:
+            created = []
+            try:
+                if mode == "hypopg":
+                    create_hypothetical(conn, cands)
+                else:
+                    create_real(conn, cands, created)
+                for variant, sql in (("original+index", original),
+                                     ("rewritten+index", rewritten)):
+                    cost, ms = plan_cost(conn, sql, analyze, runs)
+                    rows.append({"variant": variant, "indexes": labels,
+                                 "total_cost": cost, "execution_ms": ms})
+            finally:
+                if mode == "hypopg":
+                    reset_hypothetical(conn)
+                else:
+                    drop_real(conn, created)
+    finally:
+        conn.close()
+    return rows
+
+
+def index_verdict(rows):
+    """
+    Variante de menor custo (tempo no modo "real", senão Total Cost) e
+    o que isso sugere: "rewrite", "index", "both" ou "none".
+    """
+    def metric(r):
+        ms = r["execution_ms"]
+        return ms if ms == ms else r["total_cost"]
+
+    valid = [r for r in rows if metric(r) == metric(r)]
+    if not valid:
+        return "none"
+    best = min(valid, key=metric)["variant"]
+    return {"original": "none", "rewritten": "rewrite",
+            "original+index": "index", "rewritten+index": "both"}[best]
+
+
+def index_rows(dsn: str, original: str, rewritten: str, mode: str = "hypopg",
+               label: str = ""):
+    """
+    Linhas do CSV de índices (INDEX_HEADER), 1 por variante, e imprime se
+    vale mais a reescrita, o índice ou os dois.
+    """
+    try:
+        results = evaluate_with_indexes(dsn, original, rewritten, mode)
+    except Exception as e:
+        print("Erro na avaliação de índices:", e)
+        return []
+    verdict = index_verdict(results)
+    print(f"[{label}] índices ({mode}): melhor opção = {verdict}")
+    return [[mode] + [r[k] for k in INDEX_FIELDS] + [verdict] for r in results]
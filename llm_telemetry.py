@@ -0,0 +1,260 @@
+"""
+Telemetria das chamadas aos LLMs: latência, time-to-first-token,
+tokens e vazão, por provedor.
+
+Nenhum rewrite_sql_via_* registrava tokens ou latência, então não dava
+para comparar a velocidade dos provedores nem ver por que as execuções
+chain-of-thought são lentas. Aqui cada chamada é feita em streaming e
+medida:
+
+- wall_ms: do envio ao último chunk;
+- ttft_ms: do envio ao primeiro chunk com texto;
+- prompt_tokens / completion_tokens: do uso informado pelo provedor;
+- tokens_per_sec: completion_tokens / (wall - ttft), a vazão de geração.
+
+Um adaptador por SDK (stream_openai, stream_mistral, stream_ollama,
+stream_gemini) devolve (texto, registro). TelemetryLog grava 1 linha por
+chamada em llm_calls_<runner>_<técnica>.csv, com query_id para cruzar
+com o speedup da reescrita nos results_*.csv. Rodando este arquivo, os
+CSVs de todas as execuções são resumidos por modelo x técnica em
+dbgpt_exp/llm_calls_summary.csv.
+"""
+import os
+import csv
+import glob
+import time
+import threading
+import statistics
+
+from csv_out import append_csv
+
+CALL_FIELDS = ["llm", "prompt_technique", "query_id", "call", "streamed",
+               "wall_ms", "ttft_ms", "prompt_tokens", "completion_tokens",
+               "tokens_per_sec", "error"]
+
+SUMMARY_FIELDS = ["llm", "prompt_technique", "calls", "errors",
+                  "median_wall_ms", "mean_wall_ms", "median_ttft_ms",
+                  "mean_prompt_tokens", "mean_completion_tokens",
+                  "median_tokens_per_sec"]
+
+NAN = float("nan")
+
+
+def _consume(chunks, text_of, usage_of):
+    """
+    Percorre o stream medindo o tempo. usage_of(chunk) devolve
+    (prompt_tokens, completion_tokens) ou None; vale o último não vazio.
+    """
+    t0 = time.perf_counter()
+    ttft = None
+    parts = []
+    prompt_tokens = completion_tokens = None
+    for chunk in chunks:
+        text = text_of(chunk)
+        if text:
+            if ttft is None:
+                ttft = time.perf_counter() - t0
+            parts.append(text)
+        usage = usage_of(chunk)
+        if usage:
+            prompt_tokens = usage[0] if usage[0] is not None else prompt_tokens
+            completion_tokens = usage[1] if usage[1] is not None else completion_tokens
+    wall = time.perf_counter() - t0
+    return "".join(parts), make_record(wall, ttft, prompt_tokens, completion_tokens)
+
+
+def make_record(wall_s, ttft_s=None, prompt_tokens=None, completion_tokens=None,
+                streamed=True):
+    gen = wall_s - ttft_s if ttft_s is not None else None
+    return {
+        "streamed": streamed,
+        "wall_ms": wall_s * 1000.0,
+        "ttft_ms": ttft_s * 1000.0 if ttft_s is not None else NAN,
+        "prompt_tokens": prompt_tokens if prompt_tokens is not None else "",
+        "completion_tokens": completion_tokens if completion_tokens is not None else "",
+        "tokens_per_sec": completion_tokens / gen
+        if completion_tokens and gen and gen > 0 else NAN,
+        "error": "",
+    }
+
+
+def stream_openai(client, **kwargs):
+    """
+    client.chat.completions.create em streaming; o uso vem no último
+    chunk (stream_options.include_usage).
+    """
+    chunks = client.chat.completions.create(
+        stream=True, stream_options={"include_usage": True}, **kwargs)
+
+    def text_of(c):
+        return c.choices[0].delta.content if c.choices else None
+
+    def usage_of(c):
+        u = getattr(c, "usage", None)
+        return (u.prompt_tokens, u.completion_tokens) if u else None
+
+    return _consume(chunks, text_of, usage_of)
+
+
+def stream_mistral(client, **kwargs):
+    """
+    client.chat.stream (SDK mistralai); cada evento traz o chunk em .data.
+    """
+    events = client.chat.stream(**kwargs)
+
+    def text_of(e):
+        choices = e.data.choices
+        return choices[0].delta.content if choices else None
+
+    def usage_of(e):
+        u = getattr(e.data, "usage", None)
+        return (u.prompt_tokens, u.completion_tokens) if u else None
+
+    return _consume(events, text_of, usage_of)
+
+
+def stream_ollama(chat_fn, **kwargs):
+    """
+    chat_fn(..., stream=True) (ollama.chat ou ollama_session.chat); os
+    contadores vêm no último chunk (done = True).
+    """
+    chunks = chat_fn(stream=True, **kwargs)
+
+    def text_of(c):
+        return c["message"]["content"]
+
+    def usage_of(c):
+        if not c.get("done"):
+            return None
+        return (c.get("prompt_eval_count"), c.get("eval_count"))
+
+    return _consume(chunks, text_of, usage_of)
+
+
+def stream_gemini(client, **kwargs):
+    """
+    client.models.generate_content_stream (google-genai).
+    """
+    chunks = client.models.generate_content_stream(**kwargs)
+
+    def text_of(c):
+        return c.text
+
+    def usage_of(c):
+        u = getattr(c, "usage_metadata", None)
+        return (u.prompt_token_count, u.candidates_token_count) if u else None
+
+    return _consume(chunks, text_of, usage_of)
+
+
+class TelemetryLog:
+    """
+    CSV de chamadas de um runner (llm e técnica fixos). query_id é o da
+    query sendo reescrita por esta thread (set_query), para as funções de
+    reescrita não precisarem recebê-lo.
+    """
+
+    def __init__(self, path: str, llm: str, technique: str):
+        self.path = path
+        self.llm = llm
+        self.technique = technique
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def set_query(self, query_id):
+        self._local.query_id = query_id
+
+    def record(self, rec, call: str = "rewrite", query_id=None):
+        if query_id is None:
+            query_id = getattr(self._local, "query_id", "")
+        row = dict(rec, llm=self.llm, prompt_technique=self.technique,
+                   query_id=query_id, call=call)
+        with self._lock:
+            append_csv(self.path, CALL_FIELDS, [[row.get(k, "") for k in CALL_FIELDS]])
+
+    def record_error(self, wall_s, error, call: str = "rewrite"):
+        rec = make_record(wall_s, streamed=True)
+        rec["error"] = str(error).strip().splitlines()[0] if str(error).strip() else type(error).__name__
+        self.record(rec, call)
+
+
+def call_logged(log, stream_fn, *args, call: str = "rewrite", **kwargs):
+    """
+    stream_fn(*args, **kwargs) -> (texto, registro), gravando o registro
+    (ou o erro, com o tempo até ele) em log. Retorna o texto.
+    """
+    t0 = time.perf_counter()
+    try:
+        text, rec = stream_fn(*args, **kwargs)
+    except Exception as e:
+        if log is not None:
+            log.record_error(time.perf_counter() - t0, e, call)
+        raise
+    if log is not None:
+        log.record(rec, call)
+    return text
+
+
+def _floats(rows, key):
+    out = []
+    for r in rows:
+        try:
+            v = float(r[key])
+        except (TypeError, ValueError, KeyError):
+            continue
+        if v == v:
+            out.append(v)
+    return out
+
+
+def summarize_calls(paths):
+    """
+    Resumo por (llm, técnica) de todos os CSVs de chamadas.
+    """
+    groups = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                groups.setdefault((row["llm"], row["prompt_technique"]), []).append(row)
+
+    def med(xs):
+        return statistics.median(xs) if xs else NAN
+
+    def mean(xs):
+        return statistics.mean(xs) if xs else NAN
+
+    out = []
+    for (llm, tech), rows in sorted(groups.items()):
+        ok = [r for r in rows if not r["error"]]
+        out.append({
+            "llm": llm,
+            "prompt_technique": tech,
+            "calls": len(rows),
+            "errors": len(rows) - len(ok),
+            "median_wall_ms": med(_floats(ok, "wall_ms")),
+            "mean_wall_ms": mean(_floats(ok, "wall_ms")),
+            "median_ttft_ms": med(_floats(ok, "ttft_ms")),
+            "mean_prompt_tokens": mean(_floats(ok, "prompt_tokens")),
+            "mean_completion_tokens": mean(_floats(ok, "completion_tokens")),
+            "median_tokens_per_sec": med(_floats(ok, "tokens_per_sec")),
+        })
+    return out
+
+
+if __name__ == "__main__":
+    out_dir = "dbgpt_exp"
+    paths = sorted(glob.glob(os.path.join(out_dir, "llm_calls_*.csv")))
+    paths = [p for p in paths if not p.endswith("llm_calls_summary.csv")]
+    summary = summarize_calls(paths)
+    out_path = os.path.join(out_dir, "llm_calls_summary.csv")
+    with open(out_path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(SUMMARY_FIELDS)
+        for s in summary:
+            w.writerow([s[k] for k in SUMMARY_FIELDS])
+    for s in summary:
+        print(f"{s['llm']:<24}{s['prompt_technique']:<20}{s['calls']:>5} chamadas  "
+              f"wall={s['median_wall_ms']:.0f} ms  ttft={s['median_ttft_ms']:.0f} ms  "
+              f"out={s['mean_completion_tokens']:.0f} tok  "
+              f"{s['median_tokens_per_sec']:.1f} tok/s")
+    print("Resumo gravado em:", out_path)
@@ -0,0 +1,149 @@
+"""
+Modo de carga concorrente (throughput) para original x reescrita.
+
+Todas as outras medições são de um único cliente. Aqui N processos (um
+cliente/conexão cada) executam a mesma query em loop por LOAD_SECS, e o
+resultado é a vazão (queries/s), os percentis de latência e os erros
+para cada nível de concorrência. Uma reescrita 2x mais rápida sozinha
+pode perder sob contenção (work_mem de sort/hash, locks, I/O).
+
+Processos em vez de threads: o tempo de Python de um cliente não pode
+atrasar os outros (GIL). Em cada nível original e reescrita rodam em
+sequência, com a mesma duração.
+
+Os processos são criados com "spawn", não fork: run_load é chamado da
+thread de medição do agendador enquanto threads do LLM, do pipeline e do
+CodeCarbon estão rodando, e um fork de processo com várias threads pode
+herdar um lock preso e travar o filho. Com spawn cada filho importa o
+script de novo, então todos são aquecidos antes de marcar start_at.
+
+Subir os processos e conectar (Neon remoto) pode passar do segundo de
+folga: um cliente atrasado roda uma janela deslocada. Cada cliente
+informa quando começou e terminou, e a vazão é calculada sobre a união
+das janelas (do primeiro início ao último fim), não sobre a duração
+nominal.
+"""
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import psycopg2
+
+LOAD_CLIENTS = (1, 4, 16)
+LOAD_SECS = 10.0
+START_GRACE_SECS = 1.0     # tempo para todos conectarem antes de start_at
+LATE_TOLERANCE_SECS = 0.1  # acima disso o cliente é contado como atrasado
+
+LOAD_FIELDS = ["clients", "completed", "errors", "qps",
+               "p50_ms", "p95_ms", "p99_ms", "max_ms"]
+LOAD_HEADER = ["variant"] + LOAD_FIELDS
+
+
+def _client(dsn: str, sql: str, start_at: float, duration: float):
+    """
+    Um cliente: espera start_at (todos começam juntos), roda sql em loop
+    por duration segundos. Retorna (latências_ms, erros, início, fim),
+    com início/fim em time.time().
+    """
+    latencies, errors = [], 0
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            delay = start_at - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            started = time.time()
+            deadline = time.perf_counter() + duration
+            while time.perf_counter() < deadline:
+                t0 = time.perf_counter()
+                try:
+                    cur.execute(sql)
+                    if cur.description:
+                        cur.fetchall()
+                    latencies.append((time.perf_counter() - t0) * 1000.0)
+                except Exception:
+                    errors += 1
+            ended = time.time()
+    finally:
+        conn.close()
+    return latencies, errors, started, ended
+
+
+def _ready():
+    return os.getpid()
+
+
+def _percentile(sorted_xs, p):
+    if not sorted_xs:
+        return float("nan")
+    k = min(len(sorted_xs) - 1, int(round(p / 100.0 * (len(sorted_xs) - 1))))
+    return sorted_xs[k]
+
+
+def run_load(dsn: str, sql: str, clients: int, duration: float = LOAD_SECS):
+    """
+    clients processos executando sql por duration segundos.
+    """
+    with ProcessPoolExecutor(max_workers=clients,
+                             mp_context=multiprocessing.get_context("spawn")) as pool:
+        # spawn cria um processo por submit sem worker livre: isto sobe os
+        # clients processos e espera o import de cada um terminar
+        for f in [pool.submit(_ready) for _ in range(clients)]:
+            f.result()
+        start_at = time.time() + START_GRACE_SECS
+        futures = [pool.submit(_client, dsn, sql, start_at, duration)
+                   for _ in range(clients)]
+        results = [f.result() for f in futures]
+
+    latencies = sorted(x for lats, _, _, _ in results for x in lats)
+    errors = sum(e for _, e, _, _ in results)
+    late = sum(1 for _, _, started, _ in results
+               if started - start_at > LATE_TOLERANCE_SECS)
+    if late:
+        print(f"[carga] {late}/{clients} clientes começaram depois de start_at "
+              f"(até {max(r[2] for r in results) - start_at:.2f} s); "
+              "vazão calculada sobre a união das janelas")
+    window = max(r[3] for r in results) - min(r[2] for r in results)
+    return {
+        "clients": clients,
+        "completed": len(latencies),
+        "errors": errors,
+        "qps": len(latencies) / window if window > 0 else float("nan"),
+        "p50_ms": _percentile(latencies, 50),
+        "p95_ms": _percentile(latencies, 95),
+        "p99_ms": _percentile(latencies, 99),
+        "max_ms": latencies[-1] if latencies else float("nan"),
+    }
+
+
+def sweep_load(dsn: str, original: str, rewritten: str,
+               levels=LOAD_CLIENTS, duration: float = LOAD_SECS):
+    """
+    Para cada nível de concorrência mede original e reescrita.
+    Retorna lista de dicts com "variant" + LOAD_FIELDS.
+    """
+    out = []
+    for clients in levels:
+        for variant, sql in (("original", original), ("rewritten", rewritten)):
+            res = run_load(dsn, sql, clients, duration)
+            res["variant"] = variant
+            out.append(res)
+            print(f"[carga] {variant} x{clients}: {res['qps']:.1f} q/s, "
+                  f"p95={res['p95_ms']:.1f} ms, erros={res['errors']}")
+    return out
+
+
+def load_rows(dsn: str, original: str, rewritten: str,
+              levels=LOAD_CLIENTS, duration: float = LOAD_SECS):
+    """
+    Linhas do CSV de carga (LOAD_HEADER), 1 por variante e nível de
+    concorrência. Erro no modo de carga = nenhuma linha.
+    """
+    try:
+        results = sweep_load(dsn, original, rewritten, levels, duration)
+    except Exception as e:
+        print("Erro no modo de carga:", e)
+        return []
+    return [[r["variant"]] + [r[k] for k in LOAD_FIELDS] for r in results]
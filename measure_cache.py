@@ -0,0 +1,90 @@
+"""
+Cache persistente de medições, compartilhado entre execuções, runners,
+modelos e técnicas de prompt.
+
+Chave: (banco, snapshot do banco, fingerprint da SQL normalizada, modo
+de medição). O snapshot (snapshot.py) muda quando os dados, o ANALYZE
+ou os índices mudam, então uma medição só é reaproveitada enquanto o
+banco estiver no mesmo estado; invalidate() descarta do arquivo as
+entradas de snapshots antigos.
+
+Valor: o dicionário da medição (nº de linhas e assinatura do resultado,
+distribuição de tempos, emissões, EXPLAIN completo). Gravado em JSONL
+(append), então várias varreduras podem usar o mesmo arquivo. Assim as
+queries originais de queries.txt são medidas uma vez e servem de baseline
+para todas as técnicas.
+"""
+import os
+import json
+import threading
+
+from sql_fingerprint import fingerprint
+
+
+def measurement_key(db: str, sql: str, mode: str, snapshot: str = "") -> str:
+    return f"{db}:{snapshot}:{fingerprint(sql)}:{mode}"
+
+
+class MeasurementCache:
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue   # linha truncada por interrupção
+                    self._data[rec["key"]] = rec
+
+    def get(self, key: str):
+        with self._lock:
+            rec = self._data.get(key)
+            return rec["value"] if rec else None
+
+    def put(self, key: str, value):
+        db, snapshot = key.split(":", 2)[:2]
+        rec = {"key": key, "db": db, "snapshot": snapshot, "value": value}
+        line = json.dumps(rec, default=str) + "\n"
+        with self._lock:
+            self._data[key] = rec
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def invalidate(self, db: str, snapshot: str) -> int:
+        """
+        Remove as entradas de db medidas em outro snapshot e reescreve o
+        arquivo. Retorna quantas foram removidas.
+        """
+        with self._lock:
+            stale = [k for k, rec in self._data.items()
+                     if rec.get("db") == db and rec.get("snapshot") != snapshot]
+            if not stale:
+                return 0
+            for k in stale:
+                del self._data[k]
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for rec in self._data.values():
+                    f.write(json.dumps(rec, default=str) + "\n")
+            os.replace(tmp, self.path)
+            return len(stale)
+
+    def get_or_measure(self, key: str, measure_fn):
+        """
+        Valor do cache ou, se não houver, measure_fn() (que é gravado).
+        Retorna (valor, veio_do_cache).
+        """
+        hit = self.get(key)
+        if hit is not None:
+            return hit, True
+        value = measure_fn()
+        self.put(key, value)
+        return value, False
@@ -0,0 +1,52 @@
+"""
+Sessão de longa duração com o Ollama, com reuso do prefixo do prompt.
+
+O servidor do Ollama (llama.cpp) reaproveita o KV cache da parte inicial
+do prompt que for idêntica à chamada anterior, desde que o modelo
+continue carregado. Para isso:
+
+- keep_alive longo, para o modelo não ser descarregado entre queries;
+- as partes fixas (system, instrução, exemplo) vão sempre primeiro e
+  byte a byte iguais; só a parte da query (schema/SQL) vai no final;
+- as opções de carga (num_ctx etc.) não podem mudar entre chamadas,
+  senão o modelo é recarregado e o cache se perde.
+"""
+import ollama
+
+OLLAMA_KEEP_ALIVE = "30m"
+
+_client = None
+
+
+def get_client():
+    # Um único Client (e pool HTTP) para o processo inteiro
+    global _client
+    if _client is None:
+        _client = ollama.Client()
+    return _client
+
+
+def chat(model: str, prefix_messages, user_content: str,
+         options=None, keep_alive=OLLAMA_KEEP_ALIVE, stream=False):
+    """
+    prefix_messages: mensagens fixas (idênticas em todas as chamadas).
+    user_content: única parte que varia por query.
+    stream=True devolve um iterador de chunks (ver llm_telemetry.py).
+    """
+    messages = list(prefix_messages) + [{"role": "user", "content": user_content}]
+    kwargs = {"model": model, "messages": messages, "keep_alive": keep_alive,
+              "stream": stream}
+    if options:
+        kwargs["options"] = options
+    return get_client().chat(**kwargs)
+
+
+def warm_up(model: str, prefix_messages, options=None,
+            keep_alive=OLLAMA_KEEP_ALIVE):
+    """
+    Carrega o modelo e processa o prefixo uma vez antes da varredura,
+    gerando só 1 token.
+    """
+    opts = dict(options or {})
+    opts["num_predict"] = 1
+    return chat(model, prefix_messages, "SELECT 1;", opts, keep_alive)
@@ -0,0 +1,99 @@
+"""
+Escalabilidade com workers paralelos: original x reescrita.
+
+Cada variante roda com max_parallel_workers_per_gather = 0, 1, 2, 4, 8
+(aplicado só na transação da medição, como em guc_sweep.py). Do plano
+saem Workers Planned/Launched (somados nos nós Gather/Gather Merge), e
+para cada contagem:
+
+- speedup_vs_serial = tempo com 0 workers / tempo com N;
+- speedup_per_core = speedup_vs_serial / (1 + workers lançados), i.e.
+  eficiência por processo (líder + workers).
+
+Só faz sentido num Postgres local com CPUs livres (no Neon o número de
+workers e de CPUs é limitado pelo plano). Mostra se a reescrita deixa a
+query mais ou menos paralelizável.
+"""
+import psycopg2
+
+from guc_sweep import explain_under
+
+WORKER_COUNTS = (0, 1, 2, 4, 8)
+SCALING_RUNS = 3
+
+SCALING_FIELDS = ["variant", "workers_per_gather", "execution_ms",
+                  "workers_planned", "workers_launched",
+                  "speedup_vs_serial", "speedup_per_core"]
+
+
+def workers_in_plan(plan):
+    """
+    (Workers Planned, Workers Launched) somados em toda a árvore.
+    """
+    planned = plan.get("Workers Planned", 0) or 0
+    launched = plan.get("Workers Launched", 0) or 0
+    for child in plan.get("Plans", []) or []:
+        p, l = workers_in_plan(child)
+        planned += p
+        launched += l
+    return planned, launched
+
+
+def scaling_curve(conn, sql: str, counts=WORKER_COUNTS, runs: int = SCALING_RUNS):
+    rows = []
+    for n in counts:
+        # max_parallel_workers limita o total da instância; sobe junto
+        settings = {"max_parallel_workers_per_gather": n,
+                    "max_parallel_workers": max(n, 8)}
+        ms, data = explain_under(conn, sql, settings, runs)
+        planned, launched = workers_in_plan((data or {}).get("Plan", {}))
+        rows.append({"workers_per_gather": n, "execution_ms": ms,
+                     "workers_planned": planned, "workers_launched": launched})
+
+    serial = rows[0]["execution_ms"] if rows else float("nan")
+    for r in rows:
+        ms = r["execution_ms"]
+        speedup = serial / ms if ms and ms == ms and serial == serial else float("nan")
+        r["speedup_vs_serial"] = speedup
+        r["speedup_per_core"] = speedup / (1 + r["workers_launched"])
+    return rows
+
+
+def scaling_pair(dsn: str, original: str, rewritten: str,
+                 counts=WORKER_COUNTS, runs: int = SCALING_RUNS):
+    """
+    Curvas das duas variantes. Retorna lista de dicts (SCALING_FIELDS).
+    """
+    conn = psycopg2.connect(dsn)
+    out = []
+    try:
+        for variant, sql in (("original", original), ("rewritten", rewritten)):
+            for r in scaling_curve(conn, sql, counts, runs):
+                r["variant"] = variant
+                out.append(r)
+    finally:
+        conn.close()
+    return out
+
+
+def best_speedup(rows, variant: str):
+    vals = [r["speedup_vs_serial"] for r in rows
+            if r["variant"] == variant and r["speedup_vs_serial"] == r["speedup_vs_serial"]]
+    return max(vals) if vals else float("nan")
+
+
+def parallel_rows(dsn: str, original: str, rewritten: str,
+                  counts=WORKER_COUNTS, label: str = ""):
+    """
+    Linhas do CSV de escalabilidade (SCALING_FIELDS), 1 por variante e
+    nº de workers.
+    """
+    try:
+        results = scaling_pair(dsn, original, rewritten, counts)
+    except Exception as e:
+        print("Erro na escalabilidade paralela:", e)
+        return []
+    print(f"[{label}] melhor speedup paralelo: "
+          f"orig={best_speedup(results, 'original'):.3f}, "
+          f"rew={best_speedup(results, 'rewritten'):.3f}")
+    return [[r[k] for k in SCALING_FIELDS] for r in results]
@@ -0,0 +1,191 @@
+"""
+Contabilidade de recursos do lado do servidor via pg_stat_statements
+(e pg_stat_io, quando existir — PostgreSQL 16+).
+
+O tempo medido em run_timed() mistura rede, TLS e overhead do Python.
+Aqui a query é executada em uma conexão própria, com as estatísticas
+zeradas antes, e o que o servidor contabilizou é lido logo depois:
+tempo de execução/planejamento, CPU estimada, blocos shared/local/temp,
+WAL e linhas.
+
+Requisitos (Postgres local):
+    shared_preload_libraries = 'pg_stat_statements'
+    CREATE EXTENSION pg_stat_statements;
+    track_io_timing = on   (opcional, para separar I/O de CPU)
+"""
+import psycopg2
+
+# Colunas somadas de pg_stat_statements. Nomes mudaram entre versões
+# (total_time -> total_exec_time no PG13, blk_read_time ->
+# shared_blk_read_time no PG17), então lemos o que existir.
+STATEMENT_COLUMNS = (
+    "calls", "rows",
+    "total_exec_time", "total_plan_time", "total_time",
+    "shared_blks_hit", "shared_blks_read", "shared_blks_dirtied", "shared_blks_written",
+    "local_blks_hit", "local_blks_read", "local_blks_dirtied", "local_blks_written",
+    "temp_blks_read", "temp_blks_written",
+    "blk_read_time", "blk_write_time",
+    "shared_blk_read_time", "shared_blk_write_time",
+    "temp_blk_read_time", "temp_blk_write_time",
+    "wal_records", "wal_fpi", "wal_bytes",
+)
+
+IO_COLUMNS = ("reads", "writes", "extends", "hits", "evictions", "fsyncs")
+
+# Marcador para não contabilizar as próprias queries de instrumentação
+_MARK = "/* pg_stats */"
+
+
+def _autocommit_conn(dsn):
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    return conn
+
+
+def has_pg_stat_statements(cur) -> bool:
+    cur.execute(
+        f"SELECT {_MARK} to_regclass('pg_stat_statements') IS NOT NULL")
+    return bool(cur.fetchone()[0])
+
+
+def has_pg_stat_io(cur) -> bool:
+    cur.execute(
+        f"SELECT {_MARK} to_regclass('pg_catalog.pg_stat_io') IS NOT NULL")
+    return bool(cur.fetchone()[0])
+
+
+def reset_statement_stats(cur):
+    cur.execute(f"SELECT {_MARK} pg_stat_statements_reset()")
+
+
+def read_statement_stats(cur):
+    """
+    Soma pg_stat_statements do banco atual, ignorando as queries
+    de instrumentação. Retorna dict com as colunas disponíveis.
+    """
+    cur.execute(
+        f"SELECT {_MARK} * FROM pg_stat_statements "
+        "WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database()) "
+        "AND query NOT LIKE %s "
+        "AND query NOT ILIKE 'EXPLAIN%%'",
+        (f"%{_MARK}%",),
+    )
+    names = [d[0] for d in cur.description]
+    totals = {}
+    for row in cur.fetchall():
+        rec = dict(zip(names, row))
+        for col in STATEMENT_COLUMNS:
+            v = rec.get(col)
+            if v is not None:
+                totals[col] = totals.get(col, 0) + float(v)
+    return totals
+
+
+def read_io_stats(cur):
+    """
+    Snapshot de pg_stat_io para os client backends (valores cumulativos).
+    """
+    cur.execute(f"SELECT {_MARK} pg_stat_clear_snapshot()")
+    cur.execute(
+        f"SELECT {_MARK} "
+        + ", ".join(f"COALESCE(SUM({c}), 0)" for c in IO_COLUMNS)
+        + " FROM pg_stat_io WHERE backend_type = 'client backend'"
+    )
+    return dict(zip(IO_COLUMNS, (float(v) for v in cur.fetchone())))
+
+
+def _flush_own_stats(cur):
+    # As estatísticas de I/O do backend só são publicadas quando ele fica
+    # ocioso; pg_stat_force_next_flush (PG15+) evita o atraso de ~1 s.
+    try:
+        cur.execute(f"SELECT {_MARK} pg_stat_force_next_flush()")
+    except psycopg2.Error:
+        pass
+
+
+def summarize(stmt, io=None):
+    """
+    Converte os totais em métricas por query (colunas do CSV).
+    CPU é estimada como tempo de execução menos tempo de I/O de blocos
+    (precisa de track_io_timing = on para ser mais do que o tempo total).
+    """
+    exec_ms = stmt.get("total_exec_time", stmt.get("total_time", 0.0))
+    io_ms = (
+        stmt.get("blk_read_time", stmt.get("shared_blk_read_time", 0.0))
+        + stmt.get("blk_write_time", stmt.get("shared_blk_write_time", 0.0))
+        + stmt.get("temp_blk_read_time", 0.0)
+        + stmt.get("temp_blk_write_time", 0.0)
+    )
+    out = {
+        "server_exec_ms": exec_ms,
+        "server_plan_ms": stmt.get("total_plan_time", 0.0),
+        "server_cpu_ms_est": max(exec_ms - io_ms, 0.0),
+        "server_io_ms": io_ms,
+        "rows": stmt.get("rows", 0.0),
+        "shared_blks_hit": stmt.get("shared_blks_hit", 0.0),
+        "shared_blks_read": stmt.get("shared_blks_read", 0.0),
+        "shared_blks_dirtied": stmt.get("shared_blks_dirtied", 0.0),
+        "shared_blks_written": stmt.get("shared_blks_written", 0.0),
+        "local_blks_read": stmt.get("local_blks_read", 0.0),
+        "local_blks_written": stmt.get("local_blks_written", 0.0),
+        "temp_blks_read": stmt.get("temp_blks_read", 0.0),
+        "temp_blks_written": stmt.get("temp_blks_written", 0.0),
+        "wal_records": stmt.get("wal_records", 0.0),
+        "wal_bytes": stmt.get("wal_bytes", 0.0),
+    }
+    if io is not None:
+        for c in IO_COLUMNS:
+            out[f"io_{c}"] = io.get(c, 0.0)
+    return out
+
+
+STATS_FIELDS = list(summarize({}, {c: 0.0 for c in IO_COLUMNS}).keys())
+
+
+def measure_server_side(dsn, sql: str):
+    """
+    Zera pg_stat_statements, executa sql numa conexão dedicada e retorna
+    (rows, métricas do servidor). pg_stat_io é lido por diferença.
+    """
+    conn = _autocommit_conn(dsn)
+    try:
+        with conn.cursor() as cur:
+            if not has_pg_stat_statements(cur):
+                raise RuntimeError(
+                    "pg_stat_statements não está instalado neste banco.")
+            with_io = has_pg_stat_io(cur)
+
+            io_before = read_io_stats(cur) if with_io else None
+            reset_statement_stats(cur)
+
+            cur.execute(sql)
+            rows = cur.fetchall() if cur.description else []
+
+            _flush_own_stats(cur)
+            stmt = read_statement_stats(cur)
+            io = None
+            if with_io:
+                io_after = read_io_stats(cur)
+                io = {c: io_after[c] - io_before[c] for c in IO_COLUMNS}
+            return rows, summarize(stmt, io)
+    finally:
+        conn.close()
+
+
+SERVER_STATS_HEADER = ["variant"] + STATS_FIELDS
+
+
+def server_stats_rows(dsn, original: str, rewritten: str):
+    """
+    Linhas do CSV de métricas do servidor (SERVER_STATS_HEADER), 1 por
+    variante. Se a contabilidade falhar, a linha sai com as métricas vazias.
+    """
+    rows = []
+    for variant, sql in (("original", original), ("rewritten", rewritten)):
+        try:
+            _, stats = measure_server_side(dsn, sql)
+        except Exception as e:
+            print(f"Erro pg_stat_statements ({variant}):", e)
+            stats = {}
+        rows.append([variant] + [stats.get(k, "") for k in STATS_FIELDS])
+    return rows
@@ -0,0 +1,131 @@
+"""
+Pipeline em dois estágios: geração de reescritas x medição no banco.
+
+No laço original de cada runner a chamada ao LLM, as execuções no banco
+e a escrita do CSV acontecem em sequência para cada query, então o banco
+fica parado enquanto o provedor responde e vice-versa. Aqui:
+
+- estágio 1 (rewrite): um pool de workers chama o LLM e grava cada
+  reescrita numa fila durável (JSONL, com fsync) antes de repassá-la;
+- estágio 2 (measure): outro pool consome a fila e mede no banco;
+- a fila em memória entre os estágios é limitada (back-pressure): se a
+  medição atrasar, o estágio 1 espera em vez de acumular reescritas;
+- as linhas de resultado passam por um único sink (escrita serializada).
+
+Ao reiniciar, reescritas já presentes no arquivo da fila são reaproveitadas
+e não voltam ao LLM.
+"""
+import os
+import json
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+REWRITE_WORKERS = 4
+MEASURE_WORKERS = 1    # >1 faz queries concorrerem no banco e distorce tempos
+QUEUE_SIZE = 8
+
+_DONE = object()
+
+
+def load_rewrite_queue(path: str):
+    """
+    {query_id: registro} das reescritas já gravadas no arquivo da fila.
+    """
+    records = {}
+    if not os.path.exists(path):
+        return records
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue   # linha truncada por interrupção
+            records[rec["query_id"]] = rec
+    return records
+
+
+class _QueueFile:
+    def __init__(self, path):
+        self._f = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def append(self, rec):
+        line = json.dumps(rec, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._f.write(line)
+            self._f.flush()
+            os.fsync(self._f.fileno())
+
+    def close(self):
+        self._f.close()
+
+
+def run_pipeline(queries, rewrite_fn, measure_fn, sink_fn, queue_path: str,
+                 rewrite_workers: int = REWRITE_WORKERS,
+                 measure_workers: int = MEASURE_WORKERS,
+                 queue_size: int = QUEUE_SIZE):
+    """
+    queries:    lista de (query_id, sql)
+    rewrite_fn: (query_id, sql) -> sql reescrita                 [estágio 1]
+    measure_fn: registro {query_id, original, rewritten} -> res  [estágio 2]
+    sink_fn:    res -> None, chamado serializado (escrita de CSV)
+
+    Retorna a lista de resultados na ordem em que ficaram prontos.
+    """
+    done = load_rewrite_queue(queue_path)
+    handoff = queue.Queue(maxsize=queue_size)
+    qfile = _QueueFile(queue_path)
+    sink_lock = threading.Lock()
+    results = []
+    errors = []
+
+    def produce(query_id, sql):
+        try:
+            rec = done.get(query_id)
+            if rec is None or rec.get("original") != sql:
+                rewritten = rewrite_fn(query_id, sql)
+                rec = {"query_id": query_id, "original": sql,
+                       "rewritten": rewritten or ""}
+                qfile.append(rec)
+            handoff.put(rec)   # bloqueia se o estágio 2 estiver atrasado
+        except Exception as e:
+            errors.append(e)
+            print(f"Erro reescrita Q{query_id}:", e)
+
+    def consume():
+        while True:
+            rec = handoff.get()
+            if rec is _DONE:
+                return
+            try:
+                res = measure_fn(rec)
+                with sink_lock:
+                    sink_fn(res)
+                    results.append(res)
+            except Exception as e:
+                errors.append(e)
+                print(f"Erro medição Q{rec['query_id']}:", e)
+
+    consumers = [threading.Thread(target=consume, daemon=True)
+                 for _ in range(measure_workers)]
+    for t in consumers:
+        t.start()
+
+    try:
+        with ThreadPoolExecutor(max_workers=rewrite_workers) as pool:
+            for query_id, sql in queries:
+                pool.submit(produce, query_id, sql)
+    finally:
+        for _ in consumers:
+            handoff.put(_DONE)
+        for t in consumers:
+            t.join()
+        qfile.close()
+
+    if errors:
+        print(f"Pipeline terminou com {len(errors)} erro(s).")
+    return results
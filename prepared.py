@@ -0,0 +1,140 @@
+"""
+Benchmark de templates parametrizados como prepared statements.
+
+As queries de queries.txt são literais executadas com cur.execute(sql),
+que replaneja a cada execução. Em produção as mesmas queries rodam
+parametrizadas e com cache de plano; um ganho da reescrita pode sumir
+(ou aparecer) com o plano genérico ou com parâmetros enviesados.
+
+Um template é uma entrada do corpus com $1, $2, ... na SQL e:
+- "params": conjuntos de parâmetros explícitos ([[1], [42], ...]), e/ou
+- "param_sql": query que devolve tuplas candidatas tiradas do próprio
+  banco (ids de clientes, intervalos de datas...). As tuplas são
+  sorteadas entre as LINHAS, então valores frequentes saem mais vezes
+  (o viés dos parâmetros acompanha o dos dados);
+- "param_types" (opcional): tipos do PREPARE, quando o Postgres não
+  consegue inferir.
+
+Cada variante é preparada (PREPARE) e executada com EXECUTE para cada
+conjunto de parâmetros, com plan_cache_mode = force_custom_plan e
+force_generic_plan (Postgres 12+).
+"""
+import time
+import statistics
+
+PLAN_MODES = ("force_custom_plan", "force_generic_plan")
+SAMPLE_SIZE = 20
+SAMPLE_SEED = 0.42
+
+STMT_NAME = "bench_stmt"
+
+PREPARED_HEADER = ["variant", "plan_cache_mode", "params_sets", "runs", "errors",
+                   "mean_ms", "median_ms", "p95_ms", "speedup"]
+
+
+def is_template(entry) -> bool:
+    return bool(entry.get("params") or entry.get("param_sql"))
+
+
+def sample_params(conn, param_sql: str, n: int = SAMPLE_SIZE, seed: float = SAMPLE_SEED):
+    """
+    n tuplas sorteadas (reprodutível via setseed) das linhas de param_sql.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT setseed(%s)", (seed,))
+        cur.execute(f"SELECT * FROM ({param_sql}) AS s ORDER BY random() LIMIT %s", (n,))
+        return [list(r) for r in cur.fetchall()]
+
+
+def param_sets_for(conn, entry, n: int = SAMPLE_SIZE):
+    sets = [list(p) for p in entry.get("params") or []]
+    if entry.get("param_sql"):
+        sets += sample_params(conn, entry["param_sql"], n)
+    return sets
+
+
+def _percentile(xs, p):
+    if not xs:
+        return float("nan")
+    xs = sorted(xs)
+    k = min(len(xs) - 1, max(0, int(round(p / 100.0 * (len(xs) - 1)))))
+    return xs[k]
+
+
+def benchmark_prepared(conn, sql: str, param_sets, plan_mode: str,
+                       param_types=None, warmup: int = 1):
+    """
+    PREPARE sql e EXECUTE com cada conjunto de parâmetros no plan_mode.
+    conn deve estar em autocommit (um EXECUTE com erro não aborta os demais).
+    Retorna {plan_cache_mode, runs, errors, mean_ms, median_ms, p95_ms}.
+    """
+    sql = sql.strip().rstrip(";")
+    types = f"({', '.join(param_types)})" if param_types else ""
+    times, errors = [], 0
+    with conn.cursor() as cur:
+        cur.execute("SET plan_cache_mode = %s", (plan_mode,))
+        cur.execute(f"PREPARE {STMT_NAME}{types} AS {sql}")
+        try:
+            for params in param_sets:
+                placeholders = ", ".join(["%s"] * len(params))
+                execute = f"EXECUTE {STMT_NAME}({placeholders})" if params \
+                    else f"EXECUTE {STMT_NAME}"
+                try:
+                    for _ in range(warmup):
+                        cur.execute(execute, params)
+                        if cur.description:
+                            cur.fetchall()
+                    t0 = time.perf_counter()
+                    cur.execute(execute, params)
+                    if cur.description:
+                        cur.fetchall()
+                    times.append((time.perf_counter() - t0) * 1000.0)
+                except Exception as e:
+                    errors += 1
+                    print(f"Erro EXECUTE {params}:", e)
+        finally:
+            cur.execute(f"DEALLOCATE {STMT_NAME}")
+            cur.execute("RESET plan_cache_mode")
+    return {
+        "plan_cache_mode": plan_mode,
+        "runs": len(times),
+        "errors": errors,
+        "mean_ms": statistics.mean(times) if times else float("nan"),
+        "median_ms": statistics.median(times) if times else float("nan"),
+        "p95_ms": _percentile(times, 95),
+    }
+
+
+def compare_prepared(conn, original: str, rewritten: str, param_sets,
+                     param_types=None, plan_modes=PLAN_MODES):
+    """
+    Mede original e reescrita com os mesmos parâmetros em cada modo.
+    Retorna lista de dicts com "variant" e "speedup" (mediana original /
+    mediana reescrita, no mesmo modo).
+    """
+    out = []
+    for mode in plan_modes:
+        res = {}
+        for variant, sql in (("original", original), ("rewritten", rewritten)):
+            try:
+                res[variant] = benchmark_prepared(conn, sql, param_sets, mode, param_types)
+            except Exception as e:
+                print(f"Erro PREPARE ({variant}, {mode}):", e)
+                res[variant] = {"plan_cache_mode": mode, "runs": 0,
+                                "errors": len(param_sets), "mean_ms": float("nan"),
+                                "median_ms": float("nan"), "p95_ms": float("nan")}
+        m_o = res["original"]["median_ms"]
+        m_r = res["rewritten"]["median_ms"]
+        speedup = m_o / m_r if m_r == m_r and m_r > 0 and m_o == m_o else float("nan")
+        for variant in ("original", "rewritten"):
+            out.append(dict(res[variant], variant=variant, speedup=speedup))
+    return out
+
+
+def prepared_rows(results, n_param_sets: int):
+    """
+    Linhas do CSV de prepared statements (PREPARED_HEADER) a partir do
+    retorno de compare_prepared().
+    """
+    return [[r["variant"], r["plan_cache_mode"], n_param_sets, r["runs"], r["errors"],
+             r["mean_ms"], r["median_ms"], r["p95_ms"], r["speedup"]] for r in results]
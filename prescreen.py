@@ -0,0 +1,143 @@
+"""
+Pré-triagem em lote com EXPLAIN (sem ANALYZE) em pipeline mode.
+
+Um EXPLAIN por vez custa um round-trip por comando; no Neon (remoto)
+isso é quase todo o tempo. Com o psycopg 3 (async) em pipeline mode do
+libpq, todos os EXPLAIN do lote são enviados de uma vez e os custos
+estimados e erros de parse/planejamento voltam juntos: ~1 round-trip
+para o corpus inteiro em vez de N.
+
+Num pipeline, o erro de um comando aborta os seguintes até o próximo
+Sync (PipelineAborted); esses são reenviados num novo pipeline. Se uma
+rodada não avança, o primeiro pendente roda sozinho, fora do pipeline.
+
+O psycopg 3 é opcional: sem ele a triagem roda em sequência com o
+psycopg2 (mesmo resultado, N round-trips).
+"""
+import sys
+import asyncio
+
+import psycopg2
+
+try:
+    import psycopg
+except ImportError:   # opcional: sem ele, fallback sequencial
+    psycopg = None
+
+PRESCREEN_FIELDS = ["ok", "total_cost", "plan_rows", "error"]
+PRESCREEN_HEADER = ["variant"] + PRESCREEN_FIELDS + ["est_cost_ratio"]
+
+
+def _parse(data):
+    plan = data[0]["Plan"]
+    return {"ok": True, "total_cost": plan["Total Cost"],
+            "plan_rows": plan["Plan Rows"], "error": ""}
+
+
+def _failed(e):
+    return {"ok": False, "total_cost": float("nan"), "plan_rows": float("nan"),
+            "error": str(e).strip().splitlines()[0] if str(e).strip() else type(e).__name__}
+
+
+def _explain_sql(sql: str) -> str:
+    return "EXPLAIN (FORMAT JSON) " + sql.strip().rstrip(";")
+
+
+def prescreen_sequential(dsn: str, sqls):
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    results = []
+    try:
+        with conn.cursor() as cur:
+            for sql in sqls:
+                try:
+                    cur.execute(_explain_sql(sql))
+                    results.append(_parse(cur.fetchone()[0]))
+                except psycopg2.Error as e:
+                    results.append(_failed(e))
+    finally:
+        conn.close()
+    return results
+
+
+async def _pipeline_round(conn, sqls, pending, results):
+    """
+    Envia os pendentes num pipeline. Retorna os índices abortados.
+    """
+    aborted = []
+    async with conn.pipeline() as p:
+        curs = []
+        for i in pending:
+            cur = conn.cursor()
+            try:
+                await cur.execute(_explain_sql(sqls[i]))
+            except psycopg.errors.PipelineAborted:
+                aborted.append(i)
+                continue
+            except psycopg.Error as e:
+                results[i] = _failed(e)
+                continue
+            curs.append((i, cur))
+        try:
+            await p.sync()
+        except psycopg.Error:
+            pass   # o erro aparece de novo no cursor que falhou
+
+        for i, cur in curs:
+            if results[i] is not None:
+                continue
+            try:
+                results[i] = _parse((await cur.fetchone())[0])
+            except psycopg.errors.PipelineAborted:
+                aborted.append(i)
+            except psycopg.ProgrammingError:
+                aborted.append(i)   # sem resultado: reenviar
+            except psycopg.Error as e:
+                results[i] = _failed(e)
+    return sorted(aborted)
+
+
+async def _prescreen_async(dsn: str, sqls):
+    results = [None] * len(sqls)
+    async with await psycopg.AsyncConnection.connect(dsn, autocommit=True) as conn:
+        pending = list(range(len(sqls)))
+        while pending:
+            try:
+                left = await _pipeline_round(conn, sqls, pending, results)
+            except psycopg.Error:
+                left = [i for i in pending if results[i] is None]
+            if len(left) == len(pending):
+                # sem progresso: o primeiro roda sozinho
+                i = left.pop(0)
+                try:
+                    cur = await conn.execute(_explain_sql(sqls[i]))
+                    results[i] = _parse((await cur.fetchone())[0])
+                except psycopg.Error as e:
+                    results[i] = _failed(e)
+            pending = left
+    return results
+
+
+def prescreen(dsn: str, sqls):
+    """
+    [{ok, total_cost, plan_rows, error}] na ordem de sqls.
+    """
+    if not sqls:
+        return []
+    if psycopg is None:
+        return prescreen_sequential(dsn, sqls)
+    if sys.platform == "win32":
+        # o psycopg async não funciona com o ProactorEventLoop padrão
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    return asyncio.run(_prescreen_async(dsn, list(sqls)))
+
+
+def pair_rows(ro, rr):
+    """
+    Linhas do CSV de triagem (PRESCREEN_HEADER) de um par original /
+    reescrita, com a razão entre os custos estimados.
+    """
+    ratio = ro["total_cost"] / rr["total_cost"] \
+        if ro["ok"] and rr["ok"] and rr["total_cost"] > 0 else float("nan")
+    return [[variant] + [r[k] for k in PRESCREEN_FIELDS] + [ratio]
+            for variant, r in (("original", ro), ("rewritten", rr))]
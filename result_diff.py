@@ -0,0 +1,95 @@
+"""
+Diff do resultado de original x reescrita calculado no servidor.
+
+Quando same_signature é False só sabemos que os resultados diferem.
+Aqui um único comando calcula (A EXCEPT ALL B) e (B EXCEPT ALL A) no
+Postgres e devolve só as contagens e até DIFF_SAMPLE linhas de cada
+lado (como JSON): nada perto do resultado inteiro vem para o cliente.
+
+As duas queries viram CTEs MATERIALIZED, então cada uma roda uma vez.
+Se as duas diferenças são vazias, o conteúdo é o mesmo e só a ordem das
+linhas mudou (a assinatura é sensível à ordem).
+"""
+import json
+
+import psycopg2
+
+DIFF_SAMPLE = 5
+
+DIFF_FIELDS = ["rows_original", "rows_rewritten", "only_in_original",
+               "only_in_rewritten", "order_only", "sample_original",
+               "sample_rewritten", "error"]
+
+DIFF_SQL = """
+WITH a AS MATERIALIZED ({original}),
+     b AS MATERIALIZED ({rewritten}),
+     only_a AS (SELECT * FROM a EXCEPT ALL SELECT * FROM b),
+     only_b AS (SELECT * FROM b EXCEPT ALL SELECT * FROM a)
+SELECT 'count', (SELECT count(*) FROM a), (SELECT count(*) FROM b),
+       (SELECT count(*) FROM only_a), (SELECT count(*) FROM only_b), NULL
+UNION ALL
+(SELECT 'a', NULL, NULL, NULL, NULL, row_to_json(x)::text FROM only_a x LIMIT {limit})
+UNION ALL
+(SELECT 'b', NULL, NULL, NULL, NULL, row_to_json(y)::text FROM only_b y LIMIT {limit})
+"""
+
+
+def _strip(sql: str) -> str:
+    return sql.strip().rstrip(";").strip()
+
+
+def diff_results(conn, original: str, rewritten: str, limit: int = DIFF_SAMPLE):
+    """
+    {DIFF_FIELDS}. Com colunas incompatíveis (nº ou tipos diferentes) o
+    EXCEPT falha e só "error" vem preenchido.
+    """
+    out = {k: "" for k in DIFF_FIELDS}
+    sql = DIFF_SQL.format(original=_strip(original), rewritten=_strip(rewritten),
+                          limit=int(limit))
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql)
+            rows = cur.fetchall()
+    except Exception as e:
+        conn.rollback()
+        out["error"] = str(e).strip().splitlines()[0]
+        return out
+    finally:
+        if not conn.autocommit:
+            conn.rollback()
+
+    samples = {"a": [], "b": []}
+    for kind, n_a, n_b, only_a, only_b, row in rows:
+        if kind == "count":
+            out.update(rows_original=n_a, rows_rewritten=n_b,
+                       only_in_original=only_a, only_in_rewritten=only_b,
+                       order_only=(only_a == 0 and only_b == 0))
+        else:
+            samples[kind].append(json.loads(row))
+    out["sample_original"] = json.dumps(samples["a"], ensure_ascii=False, default=str)
+    out["sample_rewritten"] = json.dumps(samples["b"], ensure_ascii=False, default=str)
+    return out
+
+
+def result_diff_rows(dsn: str, original: str, rewritten: str, label: str = ""):
+    """
+    Linha do CSV de diff (DIFF_FIELDS), numa lista; lista vazia se não
+    foi possível conectar.
+    """
+    try:
+        conn = psycopg2.connect(dsn)
+    except Exception as e:
+        print("Erro no diff de resultados:", e)
+        return []
+    try:
+        d = diff_results(conn, original, rewritten)
+    finally:
+        conn.close()
+    if d["error"]:
+        print(f"[{label}] diff impossível: {d['error']}")
+    elif d["order_only"]:
+        print(f"[{label}] mesmas linhas, só a ordem difere")
+    else:
+        print(f"[{label}] diff: {d['only_in_original']} só na original, "
+              f"{d['only_in_rewritten']} só na reescrita")
+    return [[d[k] for k in DIFF_FIELDS]]
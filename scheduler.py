@@ -0,0 +1,175 @@
+"""
+Agendador que separa trabalho de throughput de trabalho sensível a tempo.
+
+Com qualquer paralelismo, queries concorrentes no mesmo Postgres
+distorcem o Execution Time e os contadores de buffers umas das outras.
+
+- throughput (chamadas ao LLM, EXPLAIN de triagem, checagens de
+  equivalência): pool de threads, roda em paralelo;
+- medição (execuções cronometradas): uma única thread, fixada em uma CPU
+  (Linux), com uma conexão dedicada, e em exclusão mútua com o trabalho
+  de throughput que usa o banco (uses_db=True): a medição espera esse
+  trabalho terminar e ele não começa enquanto houver medição pendente.
+
+abab() alterna original/reescrita (A B A B ...) na conexão dedicada, para
+que deriva (cache esquentando, ruído da máquina) afete os dois igualmente.
+"""
+import os
+import time
+import statistics
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+
+THROUGHPUT_WORKERS = 4
+
+
+class _Gate:
+    """
+    Lock leitores/escritor com preferência para o escritor: o trabalho de
+    throughput que usa o banco entra como leitor, a medição como escritor.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def shared(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                self._cond.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class MeasurementScheduler:
+
+    def __init__(self, dsn, throughput_workers: int = THROUGHPUT_WORKERS,
+                 cpu=None, server_cpu=None):
+        """
+        cpu: CPU onde fixar a thread de medição (None = não fixa).
+        server_cpu: CPU onde fixar o backend do Postgres da conexão
+        dedicada; só funciona com o servidor na mesma máquina e com
+        permissão sobre o processo.
+        """
+        self._dsn = dsn
+        self._cpu = cpu
+        self._server_cpu = server_cpu
+        self._gate = _Gate()
+        self._local = threading.local()
+        self.conn = None
+        self._throughput = ThreadPoolExecutor(
+            max_workers=throughput_workers, thread_name_prefix="throughput")
+        self._timing = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="timing",
+            initializer=self._init_timing_thread)
+
+    def _init_timing_thread(self):
+        if self._cpu is not None and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, {self._cpu})
+        self.conn = psycopg2.connect(self._dsn)
+        self.conn.autocommit = True
+        if self._server_cpu is not None and hasattr(os, "sched_setaffinity"):
+            with self.conn.cursor() as cur:
+                cur.execute("SELECT pg_backend_pid()")
+                pid = cur.fetchone()[0]
+            try:
+                os.sched_setaffinity(pid, {self._server_cpu})
+            except OSError as e:
+                print("Não foi possível fixar o backend do Postgres:", e)
+
+    # ===== THROUGHPUT =====
+
+    def submit_throughput(self, fn, *args, uses_db: bool = False, **kwargs):
+        """
+        Agenda fn no pool de throughput e retorna o Future. Com uses_db,
+        fn não roda ao mesmo tempo que uma medição.
+        """
+        if not uses_db:
+            return self._throughput.submit(fn, *args, **kwargs)
+
+        def gated():
+            with self._gate.shared():
+                return fn(*args, **kwargs)
+        return self._throughput.submit(gated)
+
+    # ===== MEDIÇÃO =====
+
+    def _exclusive(self, fn, args, kwargs):
+        if getattr(self._local, "inside", False):
+            return fn(*args, **kwargs)
+        with self._gate.exclusive():
+            self._local.inside = True
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._local.inside = False
+
+    def timing(self, fn, *args, **kwargs):
+        """
+        Executa fn na thread de medição, em exclusão com o trabalho de
+        throughput que usa o banco. Bloqueia até terminar.
+        """
+        if getattr(self._local, "inside", False):
+            return fn(*args, **kwargs)
+        return self._timing.submit(self._exclusive, fn, args, kwargs).result()
+
+    def _timed_once(self, sql: str):
+        with self.conn.cursor() as cur:
+            t0 = time.perf_counter()
+            cur.execute(sql)
+            if cur.description:
+                cur.fetchall()
+            return (time.perf_counter() - t0) * 1000.0
+
+    def _abab(self, sql_a: str, sql_b: str, rounds: int, warmup: bool):
+        if warmup:
+            self._timed_once(sql_a)
+            self._timed_once(sql_b)
+        times_a, times_b = [], []
+        for _ in range(rounds):
+            times_a.append(self._timed_once(sql_a))
+            times_b.append(self._timed_once(sql_b))
+        return times_a, times_b
+
+    def abab(self, sql_a: str, sql_b: str, rounds: int = 3, warmup: bool = True):
+        """
+        Tempos (ms) de A e B alternados na conexão dedicada.
+        Retorna (tempos_a, tempos_b).
+        """
+        return self.timing(self._abab, sql_a, sql_b, rounds, warmup)
+
+    def close(self):
+        self._throughput.shutdown(wait=True)
+        if self.conn is not None:
+            self.timing(self.conn.close)
+        self._timing.shutdown(wait=True)
+
+
+def median_or_nan(xs):
+    return statistics.median(xs) if xs else float("nan")
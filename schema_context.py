@@ -0,0 +1,308 @@
+"""
+Contexto de schema para os prompts.
+
+O SCHEMA_HINT dos runners lista sempre as dez tabelas do webshop, não
+importa o que a query usa. Aqui a query é analisada, as tabelas (e
+colunas) referenciadas são identificadas e só elas vão para o prompt.
+Opcionalmente são anexadas as definições reais de índices e o número
+de linhas de cada tabela, lidos do catálogo, ou um resumo com pg_stats
+e o plano estimado da query dentro de um orçamento de tokens
+(build_stats_context).
+"""
+import os
+import re
+import json
+
+from snapshot import database_snapshot_id
+from sql_extract import tokenize
+
+# Palavras que encerram a lista de tabelas de um FROM
+_FROM_END = {
+    "where", "group", "order", "having", "limit", "offset", "on", "using",
+    "select", "union", "intersect", "except", "window", "fetch", "for",
+    "returning", "set",
+}
+
+
+def parse_schema_hint(schema_hint: str):
+    """
+    Converte linhas 'webshop.t(c1, c2, ...)' em {t: [c1, c2, ...]},
+    preservando a ordem do SCHEMA_HINT.
+    """
+    tables = {}
+    for line in schema_hint.splitlines():
+        m = re.match(r"\s*(?:(\w+)\.)?(\w+)\((.*)\)\s*$", line)
+        if m:
+            tables[m.group(2).lower()] = [c.strip().lower()
+                                         for c in m.group(3).split(",") if c.strip()]
+    return tables
+
+
+def _identifiers(sql: str):
+    """
+    Sequência de (texto, é_identificador_quoted) sem comentários e
+    literais, com pontuação relevante (',', '.', '(', ')') preservada.
+    """
+    out = []
+    for kind, text, _ in tokenize(sql):
+        if kind in ("ws", "comment", "string", "dollar", "fence"):
+            continue
+        if kind == "quoted":
+            out.append((text[1:-1].replace('""', '"').lower(), True))
+        elif kind == "word":
+            out.append((text.lower(), False))
+        elif text in ",.()":
+            out.append((text, False))
+    return out
+
+
+def referenced_tables(sql: str, tables):
+    """
+    Retorna {tabela: set(colunas)} com as tabelas conhecidas usadas em
+    FROM/JOIN e as colunas delas que aparecem na query.
+    """
+    toks = _identifiers(sql)
+    found = {}
+    in_from = False
+    prev = None
+    for idx, (text, quoted) in enumerate(toks):
+        if not quoted and text in ("from", "join"):
+            in_from = True
+        elif not quoted and text in _FROM_END:
+            in_from = False
+        elif text in tables:
+            # webshop.order / "order" são sempre tabela; nomes soltos só
+            # contam dentro de um FROM (evita confundir com colunas)
+            qualified = prev == "." and idx >= 2 and toks[idx - 2][0] == "webshop"
+            nxt = toks[idx + 1][0] if idx + 1 < len(toks) else None
+            if qualified or (in_from and nxt != "." and (quoted or text != "order")):
+                found.setdefault(text, set())
+        prev = text
+
+    words = {t for t, _ in toks}
+    for t in found:
+        found[t] = {c for c in tables[t] if c in words}
+    return found
+
+
+def prune_schema_hint(sql: str, schema_hint: str) -> str:
+    """
+    Devolve só as linhas do schema_hint das tabelas que a query usa.
+    Se nada for reconhecido, devolve o hint completo.
+    """
+    tables = parse_schema_hint(schema_hint)
+    used = referenced_tables(sql, tables)
+    if not used:
+        return schema_hint
+    lines = []
+    for line in schema_hint.splitlines():
+        m = re.match(r"\s*(?:\w+\.)?(\w+)\(", line)
+        if m and m.group(1).lower() in used:
+            lines.append(line.strip())
+    return "\n".join(lines)
+
+
+def catalog_details(conn, table_names, schema: str = "webshop"):
+    """
+    Índices (pg_indexes) e número estimado de linhas (reltuples) das
+    tabelas informadas. Retorna linhas prontas para o prompt.
+    """
+    _, catalog = cached_catalog(conn, schema)
+    names = sorted(table_names)
+    lines = [f"{schema}.{t}: ~{catalog['rows'][t]} rows"
+             for t in names if t in catalog["rows"]]
+    for t in names:
+        lines.extend(catalog["indexes"].get(t, []))
+    return lines
+
+
+def build_schema_hint(sql: str, schema_hint: str, conn=None) -> str:
+    """
+    Schema reduzido às tabelas da query; com conn, acrescenta índices e
+    contagem de linhas do catálogo.
+    """
+    pruned = prune_schema_hint(sql, schema_hint)
+    if conn is None:
+        return pruned
+    used = parse_schema_hint(pruned)
+    extra = catalog_details(conn, used.keys())
+    if not extra:
+        return pruned
+    return pruned + "\nIndexes and sizes:\n" + "\n".join(extra)
+
+
+# ===== CONTEXTO COM ESTATÍSTICAS (pg_catalog) =====
+#
+# Resumo compacto de tamanho das tabelas, índices, estatísticas das
+# colunas (pg_stats) e plano estimado da query original, limitado a um
+# orçamento de tokens. O catálogo é lido uma vez por snapshot do banco
+# (ver snapshot.py) e guardado em memória e em disco.
+
+CONTEXT_TOKEN_BUDGET = 400
+CATALOG_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "dbgpt_exp", "cache")
+
+_catalog_cache = {}   # snapshot_id -> catálogo
+_plan_cache = {}      # (snapshot_id, sql) -> linhas do plano
+
+
+def approx_tokens(text: str) -> int:
+    # ~4 caracteres por token (aproximação usual para inglês/SQL)
+    return (len(text) + 3) // 4
+
+
+def read_catalog(conn, schema: str = "webshop"):
+    """
+    Lê reltuples, índices e pg_stats de todas as tabelas do schema.
+    """
+    catalog = {"rows": {}, "indexes": {}, "stats": {}}
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT c.relname, c.reltuples::bigint "
+            "FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE n.nspname = %s AND c.relkind = 'r'",
+            (schema,),
+        )
+        for t, n in cur.fetchall():
+            catalog["rows"][t] = max(int(n), 0)
+
+        cur.execute(
+            "SELECT tablename, indexdef FROM pg_indexes "
+            "WHERE schemaname = %s ORDER BY tablename, indexname",
+            (schema,),
+        )
+        for t, indexdef in cur.fetchall():
+            catalog["indexes"].setdefault(t, []).append(indexdef)
+
+        cur.execute(
+            "SELECT tablename, attname, n_distinct, null_frac, correlation "
+            "FROM pg_stats WHERE schemaname = %s",
+            (schema,),
+        )
+        for t, col, n_distinct, null_frac, corr in cur.fetchall():
+            catalog["stats"].setdefault(t, {})[col] = [
+                float(n_distinct) if n_distinct is not None else None,
+                float(null_frac) if null_frac is not None else None,
+                float(corr) if corr is not None else None,
+            ]
+    return catalog
+
+
+def cached_catalog(conn, schema: str = "webshop"):
+    """
+    Catálogo do snapshot atual: memória -> disco -> banco.
+    Retorna (snapshot_id, catálogo).
+    """
+    snap = database_snapshot_id(conn, schema)
+    if snap in _catalog_cache:
+        return snap, _catalog_cache[snap]
+
+    path = os.path.join(CATALOG_CACHE_DIR, f"catalog_{schema}_{snap}.json")
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            catalog = json.load(f)
+    else:
+        catalog = read_catalog(conn, schema)
+        os.makedirs(CATALOG_CACHE_DIR, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(catalog, f)
+    _catalog_cache[snap] = catalog
+    return snap, catalog
+
+
+def _plan_lines(node, depth=0, out=None):
+    if out is None:
+        out = []
+    label = node.get("Node Type", "?")
+    if node.get("Relation Name"):
+        label += f" on {node['Relation Name']}"
+        if node.get("Alias") and node["Alias"] != node["Relation Name"]:
+            label += f" {node['Alias']}"
+    label += f" (rows={node.get('Plan Rows')}, cost={node.get('Total Cost')})"
+    for key in ("Index Cond", "Hash Cond", "Merge Cond", "Join Filter", "Filter"):
+        if node.get(key):
+            label += f" {key}: {node[key]}"
+    out.append("  " * depth + ("-> " if depth else "") + label)
+    for child in node.get("Plans", []):
+        _plan_lines(child, depth + 1, out)
+    return out
+
+
+def estimated_plan(conn, sql: str, snap: str):
+    """
+    EXPLAIN (sem ANALYZE) da query, em linhas indentadas; cacheado por
+    snapshot.
+    """
+    key = (snap, sql)
+    if key not in _plan_cache:
+        with conn.cursor() as cur:
+            cur.execute("EXPLAIN (FORMAT JSON) " + sql)
+            plan = cur.fetchall()[0][0][0]["Plan"]
+        _plan_cache[key] = _plan_lines(plan)
+    return _plan_cache[key]
+
+
+def _fmt_stat(v, digits=2):
+    return "?" if v is None else f"{v:.{digits}f}"
+
+
+def build_stats_context(conn, sql: str, schema_hint: str,
+                        token_budget: int = CONTEXT_TOKEN_BUDGET,
+                        schema: str = "webshop") -> str:
+    """
+    Schema reduzido + resumo do catálogo dentro de token_budget.
+    Prioridade: schema > tamanhos > índices > plano > pg_stats; cada seção
+    entra linha a linha até o orçamento acabar.
+    """
+    pruned = prune_schema_hint(sql, schema_hint)
+    used = referenced_tables(sql, parse_schema_hint(schema_hint))
+    snap, catalog = cached_catalog(conn, schema)
+
+    sizes = [f"{schema}.{t}: ~{catalog['rows'][t]} rows"
+             for t in sorted(used) if t in catalog["rows"]]
+    indexes = [d for t in sorted(used) for d in catalog["indexes"].get(t, [])]
+    try:
+        plan = estimated_plan(conn, sql, snap)
+    except Exception:
+        conn.rollback()
+        plan = []
+
+    stats = []
+    for t in sorted(used):
+        for col in sorted(used[t]):
+            st = catalog["stats"].get(t, {}).get(col)
+            if not st:
+                continue
+            n_distinct, null_frac, corr = st
+            # n_distinct negativo = fração das linhas
+            if n_distinct is not None and n_distinct < 0:
+                n_distinct = -n_distinct * catalog["rows"].get(t, 0)
+            stats.append(f"{t}.{col}: {_fmt_stat(n_distinct, 0)}, "
+                         f"{_fmt_stat(null_frac)}, {_fmt_stat(corr)}")
+
+    parts = [pruned]
+    used_tokens = approx_tokens(pruned)
+    sections = (
+        ("Table sizes:", sizes),
+        ("Indexes:", indexes),
+        ("Estimated plan of the input query:", plan),
+        ("Column stats (n_distinct, null_frac, correlation):", stats),
+    )
+    for title, lines in sections:
+        if not lines:
+            continue
+        cost = approx_tokens(title)
+        if used_tokens + cost >= token_budget:
+            break
+        kept = []
+        for line in lines:
+            c = approx_tokens(line)
+            if used_tokens + cost + c > token_budget:
+                break
+            kept.append(line)
+            cost += c
+        if kept:
+            parts.append(title)
+            parts.extend(kept)
+            used_tokens += cost
+    return "\n".join(parts)
@@ -0,0 +1,37 @@
+"""
+Identificador do "snapshot" do banco.
+
+Muda quando os dados (contadores de insert/update/delete, relfilenode
+após TRUNCATE/VACUUM FULL), as estatísticas (ANALYZE) ou os índices de
+um schema mudam. Serve de chave para caches que só valem enquanto o
+banco estiver no mesmo estado.
+"""
+import hashlib
+
+SNAPSHOT_SQL = """
+SELECT c.relname, c.relkind, c.relfilenode, c.reltuples::bigint, c.relpages,
+       COALESCE(s.n_tup_ins, 0), COALESCE(s.n_tup_upd, 0), COALESCE(s.n_tup_del, 0),
+       GREATEST(s.last_analyze, s.last_autoanalyze)::text,
+       CASE WHEN c.relkind = 'i' THEN pg_get_indexdef(c.oid) ELSE '' END
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+LEFT JOIN pg_stat_all_tables s ON s.relid = c.oid
+WHERE n.nspname = %s AND c.relkind IN ('r', 'i', 'm')
+ORDER BY c.relname
+"""
+
+
+def database_snapshot_id(conn, schema: str = "webshop") -> str:
+    """
+    Hash curto do estado do schema. Duas chamadas sem escrita/ANALYZE/DDL
+    entre elas retornam o mesmo valor.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT current_database(), "
+                    "current_setting('server_version_num')")
+        h = hashlib.sha1("|".join(cur.fetchone()).encode("utf-8"))
+        cur.execute(SNAPSHOT_SQL, (schema,))
+        for row in cur.fetchall():
+            h.update("|".join(str(v) for v in row).encode("utf-8"))
+            h.update(b"\n")
+    return h.hexdigest()[:16]
@@ -0,0 +1,229 @@
+"""
+Extração da SQL de dentro da resposta do LLM.
+
+Cada runner tinha seu extrator (regex + primeira keyword, última linha
+que começa com SELECT, .strip("```")...) e, quando falhavam, um pedaço
+de SQL que nem compila ia para o banco e virava linha com NaN no CSV.
+
+Aqui a resposta é tokenizada (comentários, strings, dollar-quotes e
+identificadores entre aspas são respeitados), quebrada em comandos no
+';' de nível 0, e é escolhido o ÚLTIMO comando completo: parênteses
+balanceados, sem string aberta, sem terminar em vírgula/AND/FROM etc., e
+que passe no parser do sqlglot (dialeto postgres).
+
+O último bloco ```sql``` tem prioridade; fora dos blocos, só conta como
+início de comando uma keyword no começo da linha ("... avoids repeated
+SELECT work per row" é explicação, não SQL). Se o comando emenda em
+texto na linha seguinte, vale o maior prefixo (em linhas) que parseia.
+
+Quando nada é extraído, extract_with_reask() faz um pedido curto ao
+modelo (REASK_MESSAGE) em vez de gastar uma execução no banco.
+"""
+import re
+
+import sqlglot
+
+MAX_REASKS = 1
+
+REASK_MESSAGE = (
+    "Your previous answer did not contain one complete, valid PostgreSQL statement. "
+    "Return ONLY the final SQL query, with NO explanations, NO comments and NO markdown."
+)
+
+TOKEN_RE = re.compile(
+    r"""
+    (?P<ws>\s+)
+  | (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<dollar>\$(?P<dtag>[A-Za-z_][A-Za-z0-9_]*)?\$.*?\$(?P=dtag)?\$)
+  | (?P<quoted>"(?:[^"]|"")*")
+  | (?P<fence>```)
+  | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+  | (?P<other>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+START_KEYWORDS = ("select", "with", "insert", "update", "delete", "values", "table")
+
+# Palavras depois das quais a SQL não pode terminar
+_DANGLING = {
+    "select", "from", "where", "and", "or", "not", "join", "on", "by", "as",
+    "in", "with", "union", "intersect", "except", "having", "set", "values",
+    "into", "then", "else", "when", "case", "between", "like", "is", "using",
+    "inner", "left", "right", "full", "cross", "outer", "distinct", "all",
+}
+
+# Palavras que continuam um comando depois de uma linha em branco
+_CONTINUES = {
+    "from", "where", "group", "order", "having", "limit", "offset", "join",
+    "inner", "left", "right", "full", "cross", "on", "and", "or", "union",
+    "intersect", "except", "select", "window", "fetch", "returning", "as",
+}
+
+_START_RE = re.compile(r"\b(" + "|".join(START_KEYWORDS) + r")\b", re.IGNORECASE)
+
+_FENCE_RE = re.compile(r"```[ \t]*(?:sql|postgresql|postgres|pgsql)?[ \t]*\n?(.*?)```",
+                       re.IGNORECASE | re.DOTALL)
+
+
+def tokenize(sql: str):
+    """
+    Lista de (tipo, texto, posição). Tipos: ws, comment, string, dollar,
+    quoted, fence, word, other.
+    """
+    return [(m.lastgroup if m.lastgroup != "dtag" else "dollar", m.group(0), m.start())
+            for m in TOKEN_RE.finditer(sql)]
+
+
+def _statement_at(text: str, start: int):
+    """
+    Comando que começa em start: vai até o ';' de nível 0 (incluído),
+    um fence, ou uma linha em branco que não seja seguida de cláusula SQL.
+    Retorna (sql, fim).
+    """
+    toks = tokenize(text[start:])
+    depth = 0
+    end = len(text)
+    for k, (kind, tok, pos) in enumerate(toks):
+        if kind == "fence":
+            end = start + pos
+            break
+        if kind == "other":
+            if tok == "(":
+                depth += 1
+            elif tok == ")":
+                depth -= 1
+            elif tok == ";" and depth <= 0:
+                end = start + pos + 1
+                break
+        elif kind == "ws" and depth <= 0 and re.search(r"\n[ \t]*\n", tok):
+            nxt = next((t for t in toks[k + 1:] if t[0] not in ("ws", "comment")), None)
+            if nxt is None or not (
+                (nxt[0] == "word" and nxt[1].lower() in _CONTINUES) or nxt[1] == ")"
+            ):
+                end = start + pos
+                break
+    return text[start:end].strip(), end
+
+
+def _looks_like_start(text: str, m) -> bool:
+    # Só no começo da linha (ou logo depois de um fence): keyword no meio
+    # de uma frase é explicação, mesmo em maiúsculas
+    before = text[:m.start()].rstrip(" \t")
+    return before == "" or before.endswith(("\n", "`"))
+
+
+def statements(text: str):
+    """
+    Comandos SQL candidatos no texto, em ordem, sem sobreposição.
+    """
+    out = []
+    pos = 0
+    while True:
+        m = _START_RE.search(text, pos)
+        if not m:
+            return out
+        if not _looks_like_start(text, m):
+            pos = m.end()
+            continue
+        stmt, end = _statement_at(text, m.start())
+        if stmt:
+            out.append(stmt)
+        pos = max(end, m.end())
+
+
+def is_valid_sql(sql: str) -> bool:
+    """
+    Checagem barata de que o comando está completo e parseia.
+    """
+    toks = [t for t in tokenize(sql or "") if t[0] not in ("ws", "comment")]
+    if not toks or toks[0][0] != "word" or toks[0][1].lower() not in START_KEYWORDS:
+        return False
+
+    depth = 0
+    for kind, tok, _ in toks:
+        if kind == "fence":
+            return False
+        if kind == "other":
+            if tok in ("'", '"'):
+                return False      # string ou identificador não fechado
+            if tok == "(":
+                depth += 1
+            elif tok == ")":
+                depth -= 1
+                if depth < 0:
+                    return False
+    if depth != 0:
+        return False
+
+    body = toks[:-1] if toks[-1][1] == ";" else toks
+    if len(body) < 2 or any(t[1] == ";" for t in body):
+        return False
+    last_kind, last, _ = body[-1]
+    if last in (",", ".", "(", "=", "<", ">", "+", "-", "*", "/"):
+        return False
+    if last_kind == "word" and last.lower() in _DANGLING:
+        return False
+
+    try:
+        sqlglot.parse_one(sql, read="postgres")
+    except Exception:
+        return False
+    return True
+
+
+def _valid_prefix(stmt: str) -> str:
+    """
+    stmt se for válido; senão o maior prefixo (em linhas) válido, para o
+    caso de a explicação vir colada na linha seguinte. "" se nenhum.
+    """
+    lines = stmt.splitlines()
+    for n in range(len(lines), 0, -1):
+        cand = "\n".join(lines[:n]).strip()
+        if is_valid_sql(cand):
+            return cand
+    return ""
+
+
+def extract_sql(text: str) -> str:
+    """
+    Último comando SQL completo e válido da resposta; "" se não houver.
+    O último bloco ```sql``` tem prioridade sobre os anteriores e sobre o
+    texto solto.
+    """
+    if not text:
+        return ""
+    regions = [m.group(1) for m in _FENCE_RE.finditer(text)] or [text]
+    for region in reversed(regions):
+        for stmt in reversed(statements(region)):
+            sql = _valid_prefix(stmt)
+            if sql:
+                return sql
+    if len(regions) > 1 or regions[0] is not text:
+        # fence com conteúdo ruim: tenta o texto inteiro sem os fences
+        for stmt in reversed(statements(text.replace("```", "\n\n"))):
+            sql = _valid_prefix(stmt)
+            if sql:
+                return sql
+    return ""
+
+
+def extract_with_reask(raw: str, reask, max_reasks: int = MAX_REASKS) -> str:
+    """
+    Extrai a SQL de raw; se falhar, chama reask(raw) -> nova resposta
+    (o runner manda REASK_MESSAGE ao mesmo modelo) até max_reasks vezes.
+    Retorna "" se nenhuma resposta tiver SQL válida.
+    """
+    sql = extract_sql(raw)
+    tries = 0
+    while not sql and reask is not None and tries < max_reasks:
+        tries += 1
+        print(f"SQL não extraída da resposta; pedindo de novo ({tries}/{max_reasks})")
+        try:
+            raw = reask(raw) or ""
+        except Exception as e:
+            print("Erro no re-ask:", e)
+            break
+        sql = extract_sql(raw)
+    return sql
@@ -0,0 +1,155 @@
+"""
+Normalização e fingerprint de SQL.
+
+Muitas reescritas voltam iguais à original (ou iguais entre técnicas)
+a menos de espaços, maiúsculas, ';' final ou comentários '--'. Para o
+banco é a mesma query, então não faz sentido medir de novo.
+
+normalize_sql():
+- remove comentários e normaliza espaços (via tokenizer do sql_extract);
+- põe em minúsculas palavras não citadas (keywords e identificadores,
+  como o próprio Postgres faz com nomes sem aspas); um nome entre aspas
+  já em minúsculas ("users") é o mesmo que sem aspas e perde as aspas,
+  "Users" continua distinto;
+- remove ';' finais;
+- renomeia aliases de tabela/subquery do FROM para t1, t2, ... na ordem
+  em que aparecem (e tira o AS opcional);
+- com parameterize=True troca literais (strings, números) por '?'.
+
+Para reaproveitar MEDIÇÕES use o fingerprint sem parameterize: mudar um
+literal muda o resultado. O parametrizado serve para agrupar queries
+com o mesmo formato (como o queryid do pg_stat_statements).
+"""
+import re
+import hashlib
+
+from sql_extract import tokenize
+
+# Nome entre aspas que o Postgres trataria igual ao mesmo nome sem aspas
+_PLAIN_QUOTED = re.compile(r'^"([a-z_][a-z0-9_$]*)"$')
+
+# Palavras que encerram a lista de tabelas de um FROM
+_FROM_END = {
+    "where", "group", "order", "having", "limit", "offset", "select",
+    "union", "intersect", "except", "window", "fetch", "for", "returning",
+    "set", "values",
+}
+
+# Palavras que podem vir logo depois de um item do FROM sem ser alias
+_NOT_ALIAS = _FROM_END | {
+    "as", "on", "using", "join", "inner", "left", "right", "full", "cross",
+    "natural", "lateral", "outer", "tablesample", "with", "only",
+}
+
+
+def _significant(sql: str):
+    """
+    Tokens sem espaços/comentários, com números agrupados e palavras não
+    citadas em minúsculas. Retorna lista de (tipo, texto).
+    """
+    out = []
+    prev_digit = False
+    for kind, text, _ in tokenize(sql):
+        if kind in ("ws", "comment", "fence"):
+            prev_digit = False
+            continue
+        if kind == "other" and (text.isdigit() or (text == "." and prev_digit)):
+            if prev_digit:
+                out[-1] = ("number", out[-1][1] + text)
+            else:
+                out.append(("number", text))
+            prev_digit = True
+            continue
+        prev_digit = False
+        if kind == "word":
+            text = text.lower()
+        elif kind == "quoted":
+            m = _PLAIN_QUOTED.match(text)
+            if m:
+                kind, text = "word", m.group(1)
+        out.append((kind, text))
+    while out and out[-1][1] == ";":
+        out.pop()
+    return out
+
+
+def _canonical_aliases(toks):
+    """
+    Troca aliases definidos no FROM/JOIN por t1, t2, ... (e as
+    referências qualificadas alias.coluna), removendo o AS opcional.
+    """
+    aliases = {}
+    defs = set()
+    drop = set()
+    in_from = False
+    stack = []
+    for i, (kind, text) in enumerate(toks):
+        after_dot = i > 0 and toks[i - 1][1] == "."
+        if kind == "other" and text == "(":
+            stack.append(in_from)
+            in_from = False
+            continue
+        if kind == "other" and text == ")":
+            in_from = stack.pop() if stack else False
+            continue
+        if kind != "word" or after_dot:
+            continue
+        if text in ("from", "join"):
+            in_from = True
+            continue
+        if text in _FROM_END:
+            in_from = False
+            continue
+        if not in_from or text in _NOT_ALIAS:
+            continue
+        prev = toks[i - 1] if i > 0 else ("", "")
+        nxt = toks[i + 1][1] if i + 1 < len(toks) else ""
+        if nxt in (".", "("):
+            continue   # nome qualificado ou função, não alias
+        if prev[1] == "as":
+            owner = toks[i - 2] if i > 1 else ("", "")
+            if owner[1] == ")" or owner[0] in ("word", "quoted"):
+                drop.add(i - 1)
+            else:
+                continue
+        elif not (prev[1] == ")" or prev[0] in ("word", "quoted")) \
+                or prev[1] in ("from", "join"):
+            continue
+        aliases.setdefault(text, f"t{len(aliases) + 1}")
+        defs.add(i)
+
+    out = []
+    for i, (kind, text) in enumerate(toks):
+        if i in drop:
+            continue
+        if kind == "word" and text in aliases and not (i > 0 and toks[i - 1][1] == "."):
+            nxt = toks[i + 1][1] if i + 1 < len(toks) else ""
+            if nxt == "." or i in defs:
+                text = aliases[text]
+        out.append((kind, text))
+    return out
+
+
+def normalize_sql(sql: str, parameterize: bool = False,
+                  canonical_aliases: bool = True) -> str:
+    toks = _significant(sql or "")
+    if canonical_aliases:
+        toks = _canonical_aliases(toks)
+    parts = []
+    for kind, text in toks:
+        if parameterize and kind in ("string", "dollar", "number"):
+            text = "?"
+        parts.append(text)
+    return " ".join(parts)
+
+
+def fingerprint(sql: str, parameterize: bool = False) -> str:
+    """
+    Hash curto da forma normalizada.
+    """
+    norm = normalize_sql(sql, parameterize=parameterize)
+    return hashlib.sha1(norm.encode("utf-8")).hexdigest()[:16]
+
+
+def same_query(a: str, b: str) -> bool:
+    return fingerprint(a) == fingerprint(b)
@@ -1,6 +1,12 @@
 import os, time, csv, json, hashlib
 from openai import OpenAI
 import psycopg2
+from sql_extract import extract_with_reask, REASK_MESSAGE
+from pipeline import run_pipeline
+from corpus import load_corpus
+from prepared import is_template
+from llm_telemetry import TelemetryLog, call_logged, stream_openai
+from tracing import tracer, span
 
 # ====== CONFIGURAÇÕES ======
 PG_HOST = "localhost"
@@ -9,11 +15,40 @@ PG_DB   = "shopmall"      # troque para "goods" quando quiser
 PG_USER = "postgres"
 PG_PASS = "postgres"
 
+# Bancos onde cada reescrita é medida: lista de (nome, DSN). O nome vai na
+# coluna "db" do CSV e a equivalência é conferida em cada um. Os alvos são
+# medidos um por vez: o tempo é cronometrado no cliente, então medições
+# simultâneas disputariam a mesma CPU.
+DB_TARGETS = [
+    (PG_DB, f"postgresql://{PG_USER}:{PG_PASS}@{PG_HOST}:{PG_PORT}/{PG_DB}"),
+    # ("webshopdb", "postgresql://..."),
+]
+
 OPENAI_MODEL = "gpt-5"    # ou "gpt-4.1" / "gpt-4o" etc.
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-QUERIES_FILE = "dbgpt_exp/queries.txt"
+CORPUS_FILE = "dbgpt_exp/queries.jsonl"
 RESULTS_CSV  = "dbgpt_exp/results.csv"
+LLM_CALLS_CSV = "dbgpt_exp/llm_calls_local.csv"
+REWRITE_QUEUE = "dbgpt_exp/rewrites_local.jsonl"   # só com PIPELINE_MODE
+
+# Pipeline: reescritas (LLM) e medições (banco) em estágios separados,
+# ligados por uma fila durável (ver pipeline.py)
+PIPELINE_MODE = False
+REWRITE_WORKERS = 4
+MEASURE_WORKERS = 1
+
+# Chamadas em streaming com TTFT, tokens e tokens/s (ver llm_telemetry.py)
+LLM_TELEMETRY = False
+llm_log = TelemetryLog(LLM_CALLS_CSV, OPENAI_MODEL, "few_shot") if LLM_TELEMETRY else None
+
+# Spans por estágio (reescrita, conexão, execução, EXPLAIN, hash, CSV).
+# No fim: linha do tempo Chrome trace/Perfetto e tabela de tempo por
+# estágio. Ver tracing.py.
+TRACE = False
+tracer.enabled = TRACE
+TRACE_FILE = "dbgpt_exp/trace_local.json"   # só com TRACE
+TRACE_SUMMARY_CSV = "dbgpt_exp/trace_summary_local.csv"
 
 # Prompt base no estilo do artigo (Instruction / Example / Input)
 PROMPT_INSTRUCTION = (
@@ -32,41 +67,43 @@ on (t1.a = avg and t1.b = t3.b);
 """
 
 # ====== CONEXÃO PG ======
-def pg_conn():
-    return psycopg2.connect(
-        host=PG_HOST, port=PG_PORT, dbname=PG_DB, user=PG_USER, password=PG_PASS
-    )
+def pg_conn(dsn=None):
+    with span("connect"):
+        return psycopg2.connect(dsn or DB_TARGETS[0][1])
 
-def fetch_all(sql: str):
-    with pg_conn() as conn, conn.cursor() as cur:
+def fetch_all(sql: str, dsn=None):
+    with pg_conn(dsn) as conn, conn.cursor() as cur:
         cur.execute(sql)
         if cur.description:
             return cur.fetchall()
         return []
 
-def run_timed(sql: str):
-    t0 = time.time()
-    rows = fetch_all(sql)
-    dt = (time.time() - t0) * 1000.0  # ms
-    return rows, dt
-
-def explain_json(sql: str):
-    with pg_conn() as conn, conn.cursor() as cur:
-        cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql)
-        data = cur.fetchall()[0][0][0]  # JSON root obj (list with one element)
-        # Times em ms, se disponíveis
-        planning = data.get("Planning Time", None)
-        execution = data.get("Execution Time", None)
-        plan = data.get("Plan", {})
-        return data, planning, execution, plan
+def run_timed(sql: str, dsn=None):
+    with span("run_timed"):
+        t0 = time.time()
+        rows = fetch_all(sql, dsn)
+        dt = (time.time() - t0) * 1000.0  # ms
+        return rows, dt
+
+def explain_json(sql: str, dsn=None):
+    with span("explain_json"):
+        with pg_conn(dsn) as conn, conn.cursor() as cur:
+            cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql)
+            data = cur.fetchall()[0][0][0]  # JSON root obj (list with one element)
+            # Times em ms, se disponíveis
+            planning = data.get("Planning Time", None)
+            execution = data.get("Execution Time", None)
+            plan = data.get("Plan", {})
+            return data, planning, execution, plan
 
 def rows_signature(rows):
-    # assinatura simples para checar equivalência de resultado
-    # (ordem pode variar; se necessário, ajuste sua query para ORDER BY)
-    h = hashlib.md5()
-    for r in rows:
-        h.update(json.dumps(r, default=str).encode("utf-8"))
-    return h.hexdigest()
+    with span("rows_signature", rows=len(rows)):
+        # assinatura simples para checar equivalência de resultado
+        # (ordem pode variar; se necessário, ajuste sua query para ORDER BY)
+        h = hashlib.md5()
+        for r in rows:
+            h.update(json.dumps(r, default=str).encode("utf-8"))
+        return h.hexdigest()
 
 # ====== OPENAI ======
 def rewrite_sql_via_llm(original_sql: str, schema_hint: str = "") -> str:
@@ -90,25 +127,112 @@ def rewrite_sql_via_llm(original_sql: str, schema_hint: str = "") -> str:
 
     user_content = "\n".join(parts)
 
-    resp = client.chat.completions.create(
-        model=OPENAI_MODEL,
-        messages=[{"role":"user","content": user_content}],
-        temperature=1
-    )
-    sql = resp.choices[0].message.content.strip().strip("```").strip()
-    return sql
+    messages = [{"role":"user","content": user_content}]
+
+    def ask(msgs, call):
+        if llm_log is not None:
+            return call_logged(llm_log, stream_openai, client, call=call,
+                               model=OPENAI_MODEL, messages=msgs, temperature=1)
+        r = client.chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=msgs,
+            temperature=1
+        )
+        return r.choices[0].message.content or ""
+
+    raw = ask(messages, "rewrite")
+
+    # Pedido curto de novo se a resposta não trouxer SQL válida
+    def reask(prev):
+        return ask(messages + [{"role":"assistant","content": prev},
+                               {"role":"user","content": REASK_MESSAGE}], "reask")
+
+    return extract_with_reask(raw, reask)
 
 # ====== LEITURA DE QUERIES ======
 def read_queries(path: str):
-    # separa pelas linhas em branco
-    with open(path, "r", encoding="utf-8") as f:
-        blob = f.read()
-    blocks = [b.strip() for b in blob.split("\n\n") if b.strip() and not b.strip().startswith("--")]
-    return blocks
+    """
+    Lista de (query_id, sql) do corpus (corpus.py). Templates
+    parametrizados ficam de fora (só rodam com PREPARED_MODE no
+    test_Mistral).
+    """
+    return [(e["id"], e["sql"]) for e in load_corpus(path).entries
+            if not is_template(e)]
+
+# ====== MEDIÇÃO ======
+def rewrite_query(i, original):
+    with span("rewrite", query_id=i, model=OPENAI_MODEL, technique="few_shot"):
+        if llm_log is not None:
+            llm_log.set_query(i)
+        return rewrite_sql_via_llm(original)
+
+def measure_query(i, original, rewritten, target=None):
+    """
+    Mede original e reescrita em target (padrão: o primeiro de DB_TARGETS)
+    e monta a linha do CSV; não escreve nada (a escrita fica em
+    write_measurement()).
+    """
+    with span("measure_query", query_id=i):
+        db, dsn = target or DB_TARGETS[0]
+
+        # Original
+        try:
+            rows_orig, t_orig = run_timed(original, dsn)
+            ej_orig, plan_ms_o, exec_ms_o, plan_o = explain_json(original, dsn)
+        except Exception as e:
+            print("Erro original:", e)
+            rows_orig, t_orig, ej_orig, plan_ms_o, exec_ms_o, plan_o = [], float("nan"), {}, None, None, {}
+
+        # Rewritten
+        try:
+            rows_rew, t_rew = run_timed(rewritten, dsn)
+            ej_rew, plan_ms_r, exec_ms_r, plan_r = explain_json(rewritten, dsn)
+        except Exception as e:
+            print("Erro reescrita:", e)
+            rows_rew, t_rew, ej_rew, plan_ms_r, exec_ms_r, plan_r = [], float("nan"), {}, None, None, {}
+
+        # Comparação simples de correção
+        same_count = (len(rows_orig) == len(rows_rew))
+        sig_o = rows_signature(rows_orig)
+        sig_r = rows_signature(rows_rew)
+        same_sig = (sig_o == sig_r)
+
+        # Buffers (se desejar algo do plano)
+        buffers_o = plan_o.get("Shared Hit Blocks", None) if isinstance(plan_o, dict) else None
+        buffers_r = plan_r.get("Shared Hit Blocks", None) if isinstance(plan_r, dict) else None
+
+        speedup = (t_orig / t_rew) if (isinstance(t_orig, float) and isinstance(t_rew, float) and t_rew > 0) else ""
+
+        res_row = [
+            db, i,
+            f"{t_orig:.3f}" if isinstance(t_orig, float) else "",
+            f"{exec_ms_o:.3f}" if exec_ms_o else "",
+            f"{plan_ms_o:.3f}" if plan_ms_o else "",
+            buffers_o if buffers_o is not None else "",
+            f"{t_rew:.3f}" if isinstance(t_rew, float) else "",
+            f"{exec_ms_r:.3f}" if exec_ms_r else "",
+            f"{plan_ms_r:.3f}" if plan_ms_r else "",
+            buffers_r if buffers_r is not None else "",
+            f"{speedup:.3f}" if speedup != "" else "",
+            same_count, same_sig,
+            original.replace("\n"," ").strip(),
+            rewritten.replace("\n"," ").strip()
+        ]
+        return res_row
+
+def measure_on_targets(i, original, rewritten):
+    # uma linha por alvo, na ordem de DB_TARGETS
+    return [measure_query(i, original, rewritten, target) for target in DB_TARGETS]
+
+def write_measurement(w, res_rows):
+    with span("write_csv"):
+        for res_row in res_rows:
+            w.writerow(res_row)
+        print("OK → linha gravada em results.csv")
 
 # ====== MAIN ======
 def main():
-    queries = read_queries(QUERIES_FILE)
+    queries = read_queries(CORPUS_FILE)
     first_write = not os.path.exists(RESULTS_CSV)
 
     with open(RESULTS_CSV, "a", newline="", encoding="utf-8") as f:
@@ -122,56 +246,33 @@ def main():
                 "original_sql","rewritten_sql"
             ])
 
-        for i, original in enumerate(queries, start=1):
+        if PIPELINE_MODE:
+            # Estágio 1 (LLM) e estágio 2 (banco) em paralelo; ver pipeline.py
+            print("Fila de reescritas:", REWRITE_QUEUE)
+            run_pipeline(
+                queries,
+                rewrite_fn=rewrite_query,
+                measure_fn=lambda rec: measure_on_targets(
+                    rec["query_id"], rec["original"], rec["rewritten"]),
+                sink_fn=lambda row: write_measurement(w, row),
+                queue_path=REWRITE_QUEUE,
+                rewrite_workers=REWRITE_WORKERS,
+                measure_workers=MEASURE_WORKERS,
+            )
+            return
+
+        for i, original in queries:
             print(f"\n=== Query {i} ===")
             # LLM rewrite
-            rewritten = rewrite_sql_via_llm(original)
-
-            # Original
-            try:
-                rows_orig, t_orig = run_timed(original)
-                ej_orig, plan_ms_o, exec_ms_o, plan_o = explain_json(original)
-            except Exception as e:
-                print("Erro original:", e)
-                rows_orig, t_orig, ej_orig, plan_ms_o, exec_ms_o, plan_o = [], float("nan"), {}, None, None, {}
-            
-            # Rewritten
-            try:
-                rows_rew, t_rew = run_timed(rewritten)
-                ej_rew, plan_ms_r, exec_ms_r, plan_r = explain_json(rewritten)
-            except Exception as e:
-                print("Erro reescrita:", e)
-                rows_rew, t_rew, ej_rew, plan_ms_r, exec_ms_r, plan_r = [], float("nan"), {}, None, None, {}
-
-            # Comparação simples de correção
-            same_count = (len(rows_orig) == len(rows_rew))
-            sig_o = rows_signature(rows_orig)
-            sig_r = rows_signature(rows_rew)
-            same_sig = (sig_o == sig_r)
-
-            # Buffers (se desejar algo do plano)
-            buffers_o = plan_o.get("Shared Hit Blocks", None) if isinstance(plan_o, dict) else None
-            buffers_r = plan_r.get("Shared Hit Blocks", None) if isinstance(plan_r, dict) else None
-
-            speedup = (t_orig / t_rew) if (isinstance(t_orig, float) and isinstance(t_rew, float) and t_rew > 0) else ""
-
-            w.writerow([
-                PG_DB, i,
-                f"{t_orig:.3f}" if isinstance(t_orig, float) else "",
-                f"{exec_ms_o:.3f}" if exec_ms_o else "",
-                f"{plan_ms_o:.3f}" if plan_ms_o else "",
-                buffers_o if buffers_o is not None else "",
-                f"{t_rew:.3f}" if isinstance(t_rew, float) else "",
-                f"{exec_ms_r:.3f}" if exec_ms_r else "",
-                f"{plan_ms_r:.3f}" if plan_ms_r else "",
-                buffers_r if buffers_r is not None else "",
-                f"{speedup:.3f}" if speedup != "" else "",
-                same_count, same_sig,
-                original.replace("\n"," ").strip(),
-                rewritten.replace("\n"," ").strip()
-            ])
-
-            print("OK → linha gravada em results.csv")
+            rewritten = rewrite_query(i, original)
+            write_measurement(w, measure_on_targets(i, original, rewritten))
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        if TRACE:
+            tracer.export_chrome_trace(TRACE_FILE)
+            tracer.write_summary(TRACE_SUMMARY_CSV)
+            tracer.print_summary()
+            print("Trace (chrome://tracing ou ui.perfetto.dev):", TRACE_FILE)
@@ -5,6 +5,13 @@ import json
 import hashlib
 import psycopg2
 from google import genai   
+from schema_context import build_schema_hint, build_stats_context
+from sql_extract import extract_with_reask, REASK_MESSAGE
+from pipeline import run_pipeline
+from corpus import load_corpus
+from prepared import is_template
+from llm_telemetry import TelemetryLog, call_logged, stream_gemini
+from tracing import tracer, span
 
 # CONFIG
 
@@ -25,8 +32,22 @@ webshop.stock(id, articleid, count, created, updated)
 
 PROMPT_TECHNIQUE = "zero-shot"   # zero-shot | few-shot | chain-of-thought
 
-QUERIES_FILE = "queries.txt"
+# Schema no prompt: "none", "full" (SCHEMA_HINT inteiro), "pruned" (só as
+# tabelas que a query usa), "pruned+catalog" (+ índices e nº de linhas)
+# ou "stats" (+ pg_stats e plano estimado, limitado a CONTEXT_TOKEN_BUDGET).
+# O padrão é o schema que este runner já mandava antes da opção existir.
+SCHEMA_CONTEXT = "full"
+CONTEXT_TOKEN_BUDGET = 400
+
+CORPUS_FILE = "dbgpt_exp/queries.jsonl"
 RESULTS_CSV = "results_gemini.csv"
+REWRITE_QUEUE = f"dbgpt_exp/rewrites_gemini_{PROMPT_TECHNIQUE}.jsonl"   # só com PIPELINE_MODE
+
+# Pipeline: reescritas (LLM) e medições (banco) em estágios separados,
+# ligados por uma fila durável (ver pipeline.py)
+PIPELINE_MODE = False
+REWRITE_WORKERS = 4
+MEASURE_WORKERS = 1
 
 
 # CONFIG Gemini API v2
@@ -39,6 +60,20 @@ client = genai.Client(api_key=API_KEY)
 
 GEMINI_MODEL = "gemini-2.5-flash"
 
+# Chamadas em streaming com latência, time-to-first-token, tokens e
+# tokens/s gravados por chamada. Ver llm_telemetry.py.
+LLM_TELEMETRY = False
+LLM_CALLS_CSV = f"dbgpt_exp/llm_calls_gemini_{PROMPT_TECHNIQUE}.csv"
+llm_log = TelemetryLog(LLM_CALLS_CSV, GEMINI_MODEL, PROMPT_TECHNIQUE) if LLM_TELEMETRY else None
+
+# Spans por estágio (reescrita, conexão, execução, EXPLAIN, hash, CSV).
+# No fim: linha do tempo Chrome trace/Perfetto e tabela de tempo por
+# estágio. Ver tracing.py.
+TRACE = False
+tracer.enabled = TRACE
+TRACE_FILE = f"dbgpt_exp/trace_gemini_{PROMPT_TECHNIQUE}.json"   # só com TRACE
+TRACE_SUMMARY_CSV = f"dbgpt_exp/trace_summary_gemini_{PROMPT_TECHNIQUE}.csv"
+
 # PROMPTS
 
 PROMPT_INSTRUCTION = (
@@ -100,30 +135,24 @@ def rewrite_sql_via_gemini(original_sql: str, schema_hint: str = "") -> str:
     else:
         raise ValueError(f"Técnica desconhecida: {PROMPT_TECHNIQUE}")
 
+    def ask(contents, call="rewrite"):
+        if llm_log is not None:
+            return call_logged(llm_log, stream_gemini, client, call=call,
+                               model=GEMINI_MODEL, contents=contents)
+        return client.models.generate_content(
+            model=GEMINI_MODEL,
+            contents=contents
+        ).text or ""
+
     # Tentativas
     retries = 0
     while retries < 5:
         try:
-            response = client.models.generate_content(
-                model=GEMINI_MODEL,         
-                contents=prompt
-            )
+            text = ask(prompt).strip()
 
-            text = response.text.strip()
-
-            # --- limpeza de markdown ---
-            text = text.replace("```sql", "").replace("```", "").strip()
-
-            # --- chain-of-thought: extrair somente o SQL ---
-            if PROMPT_TECHNIQUE == "chain-of-thought":
-                lines = [
-                    l for l in text.splitlines()
-                    if l.strip().upper().startswith(("SELECT", "WITH"))
-                ]
-                if lines:
-                    return "\n".join(lines).strip()
-
-            return text  # retorno padrão
+            # Pedido curto de novo se a resposta não trouxer SQL válida
+            return extract_with_reask(text, lambda prev: ask(
+                f"{prompt}\n\nPrevious answer:\n{prev}\n\n{REASK_MESSAGE}", "reask"))
 
         except Exception as e:
             print("Gemini error:", e)
@@ -138,7 +167,24 @@ def rewrite_sql_via_gemini(original_sql: str, schema_hint: str = "") -> str:
 #  POSTGRES
 
 def pg_conn():
-    return psycopg2.connect(PG_URL)
+    with span("connect"):
+        return psycopg2.connect(PG_URL)
+
+def schema_hint_for(sql: str) -> str:
+    """
+    Schema enviado no prompt conforme SCHEMA_CONTEXT.
+    """
+    if SCHEMA_CONTEXT == "full":
+        return SCHEMA_HINT
+    if SCHEMA_CONTEXT == "pruned":
+        return build_schema_hint(sql, SCHEMA_HINT)
+    if SCHEMA_CONTEXT == "pruned+catalog":
+        with pg_conn() as conn:
+            return build_schema_hint(sql, SCHEMA_HINT, conn)
+    if SCHEMA_CONTEXT == "stats":
+        with pg_conn() as conn:
+            return build_stats_context(conn, sql, SCHEMA_HINT, CONTEXT_TOKEN_BUDGET)
+    return ""
 
 def fetch_all(sql: str):
     with pg_conn() as conn, conn.cursor() as cur:
@@ -148,41 +194,93 @@ def fetch_all(sql: str):
         return []
 
 def run_timed(sql: str):
-    t0 = time.time()
-    rows = fetch_all(sql)
-    dt = (time.time() - t0) * 1000.0
-    return rows, dt
+    with span("run_timed"):
+        t0 = time.time()
+        rows = fetch_all(sql)
+        dt = (time.time() - t0) * 1000.0
+        return rows, dt
 
 def explain_json(sql: str):
-    with pg_conn() as conn, conn.cursor() as cur:
-        cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql)
-        data = cur.fetchall()[0][0][0]
-        planning = data.get("Planning Time", None)
-        execution = data.get("Execution Time", None)
-        plan = data.get("Plan", {})
-        return data, planning, execution, plan
+    with span("explain_json"):
+        with pg_conn() as conn, conn.cursor() as cur:
+            cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql)
+            data = cur.fetchall()[0][0][0]
+            planning = data.get("Planning Time", None)
+            execution = data.get("Execution Time", None)
+            plan = data.get("Plan", {})
+            return data, planning, execution, plan
 
 def rows_signature(rows):
-    h = hashlib.md5()
-    for r in rows:
-        h.update(json.dumps(r, default=str).encode("utf-8"))
-    return h.hexdigest()
+    with span("rows_signature", rows=len(rows)):
+        h = hashlib.md5()
+        for r in rows:
+            h.update(json.dumps(r, default=str).encode("utf-8"))
+        return h.hexdigest()
 
 
 #  LEITURA DE QUERIES
 
 def read_queries(path: str):
-    with open(path, "r", encoding="utf-8") as f:
-        blob = f.read()
-    blocks = [b.strip() for b in blob.split("\n\n") if b.strip() and not b.strip().startswith("--")]
-    return blocks
-
+    """
+    Lista de (query_id, sql) do corpus (corpus.py). Templates
+    parametrizados ficam de fora (só rodam com PREPARED_MODE no
+    test_Mistral).
+    """
+    return [(e["id"], e["sql"]) for e in load_corpus(path).entries
+            if not is_template(e)]
+
+
+
+# MEDIÇÃO
+
+def rewrite_query(i, original):
+    with span("rewrite", query_id=i, model=GEMINI_MODEL, technique=PROMPT_TECHNIQUE):
+        if llm_log is not None:
+            llm_log.set_query(i)
+        return rewrite_sql_via_gemini(original, schema_hint_for(original))
+
+def measure_query(i, original, rewritten):
+    """
+    Mede original e reescrita e monta a linha do CSV; não escreve nada
+    (a escrita fica em write_measurement()).
+    """
+    with span("measure_query", query_id=i):
+        try:
+            rows_o, t_o = run_timed(original)
+            ej_o, p_o, e_o, _ = explain_json(original)
+        except:
+            rows_o, t_o, p_o, e_o = [], float("nan"), None, None
 
+        try:
+            rows_r, t_r = run_timed(rewritten)
+            ej_r, p_r, e_r, _ = explain_json(rewritten)
+        except:
+            rows_r, t_r, p_r, e_r = [], float("nan"), None, None
+
+        same_count = len(rows_o) == len(rows_r)
+        same_sig = rows_signature(rows_o) == rows_signature(rows_r)
+
+        speedup = (t_o / t_r) if (t_r > 0) else ""
+
+        res_row = [
+            "webshopdb", i,
+            f"{t_o:.3f}", f"{e_o}", f"{p_o}",
+            f"{t_r:.3f}", f"{e_r}", f"{p_r}",
+            speedup, same_count, same_sig,
+            original.replace("\n", " "),
+            rewritten.replace("\n", " ")
+        ]
+        return res_row
+
+def write_measurement(w, res_row):
+    with span("write_csv"):
+        w.writerow(res_row)
+        print("OK → salvo no CSV")
 
 # MAIN
 
 def main():
-    queries = read_queries(QUERIES_FILE)
+    queries = read_queries(CORPUS_FILE)
     first = not os.path.exists(RESULTS_CSV)
 
     with open(RESULTS_CSV, "a", newline="", encoding="utf-8") as f:
@@ -196,39 +294,34 @@ def main():
                 "original_sql", "rewritten_sql"
             ])
 
-        for i, original in enumerate(queries, start=1):
-            print(f"\n=== QUERY {i} ===")
-
-            rewritten = rewrite_sql_via_gemini(original, SCHEMA_HINT)
-
-            try:
-                rows_o, t_o = run_timed(original)
-                ej_o, p_o, e_o, _ = explain_json(original)
-            except:
-                rows_o, t_o, p_o, e_o = [], float("nan"), None, None
-
-            try:
-                rows_r, t_r = run_timed(rewritten)
-                ej_r, p_r, e_r, _ = explain_json(rewritten)
-            except:
-                rows_r, t_r, p_r, e_r = [], float("nan"), None, None
-
-            same_count = len(rows_o) == len(rows_r)
-            same_sig = rows_signature(rows_o) == rows_signature(rows_r)
-
-            speedup = (t_o / t_r) if (t_r > 0) else ""
+        if PIPELINE_MODE:
+            # Estágio 1 (LLM) e estágio 2 (banco) em paralelo; ver pipeline.py
+            print("Fila de reescritas:", REWRITE_QUEUE)
+            run_pipeline(
+                queries,
+                rewrite_fn=rewrite_query,
+                measure_fn=lambda rec: measure_query(
+                    rec["query_id"], rec["original"], rec["rewritten"]),
+                sink_fn=lambda row: write_measurement(w, row),
+                queue_path=REWRITE_QUEUE,
+                rewrite_workers=REWRITE_WORKERS,
+                measure_workers=MEASURE_WORKERS,
+            )
+            return
 
-            w.writerow([
-                "webshopdb", i,
-                f"{t_o:.3f}", f"{e_o}", f"{p_o}",
-                f"{t_r:.3f}", f"{e_r}", f"{p_r}",
-                speedup, same_count, same_sig,
-                original.replace("\n", " "),
-                rewritten.replace("\n", " ")
-            ])
+        for i, original in queries:
+            print(f"\n=== QUERY {i} ===")
 
-            print("OK → salvo no CSV")
+            rewritten = rewrite_query(i, original)
+            write_measurement(w, measure_query(i, original, rewritten))
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        if TRACE:
+            tracer.export_chrome_trace(TRACE_FILE)
+            tracer.write_summary(TRACE_SUMMARY_CSV)
+            tracer.print_summary()
+            print("Trace (chrome://tracing ou ui.perfetto.dev):", TRACE_FILE)
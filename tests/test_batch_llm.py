@@ -0,0 +1,156 @@
+"""
+Modo batch (batch_llm.py) contra um endpoint de batch falso, em memória.
+
+Os clientes falsos imitam só o que submit_openai / submit_mistral usam:
+upload do JSONL, criação do job, polling de status e download da saída.
+A saída vem fora de ordem e com uma linha de erro, como a dos provedores.
+"""
+import io
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from batch_llm import (custom_id_for, parse_batch_output, submit_mistral,
+                       submit_openai, write_batch_file)
+
+QUERY_IDS = [1, 2, 10, 11]
+FAILING = custom_id_for(10)
+
+
+def _answer(custom_id):
+    return f"```sql\nSELECT {custom_id[1:]};\n```"
+
+
+def _output_jsonl(input_jsonl):
+    """
+    Saída do job: uma linha por requisição, em ordem inversa; FAILING
+    volta com erro e sem resposta.
+    """
+    lines = []
+    for line in reversed(input_jsonl.splitlines()):
+        cid = json.loads(line)["custom_id"]
+        if cid == FAILING:
+            lines.append({"custom_id": cid, "response": None,
+                          "error": {"code": "server_error", "message": "boom"}})
+        else:
+            lines.append({"custom_id": cid, "error": None, "response": {
+                "status_code": 200,
+                "body": {"choices": [{"message": {"content": _answer(cid)}}]}}})
+    return "\n".join(json.dumps(x) for x in lines) + "\n"
+
+
+class FakeOpenAI:
+    """
+    client.files.create / client.batches.create / retrieve / files.content.
+    """
+
+    def __init__(self, polls_until_done=2):
+        self.uploaded = {}
+        self.jobs = {}
+        self.polls_until_done = polls_until_done
+        self.files = SimpleNamespace(create=self._create_file, content=self._content)
+        self.batches = SimpleNamespace(create=self._create_batch, retrieve=self._retrieve)
+
+    def _create_file(self, file, purpose):
+        assert purpose == "batch"
+        fid = f"file-{len(self.uploaded)}"
+        self.uploaded[fid] = file.read().decode("utf-8")
+        return SimpleNamespace(id=fid)
+
+    def _create_batch(self, input_file_id, endpoint, completion_window):
+        for line in self.uploaded[input_file_id].splitlines():
+            rec = json.loads(line)
+            assert rec["method"] == "POST" and rec["url"] == endpoint
+        bid = f"batch-{len(self.jobs)}"
+        self.jobs[bid] = {"input": input_file_id, "polls": 0}
+        return SimpleNamespace(id=bid, status="validating", output_file_id=None)
+
+    def _retrieve(self, batch_id):
+        job = self.jobs[batch_id]
+        job["polls"] += 1
+        if job["polls"] < self.polls_until_done:
+            return SimpleNamespace(id=batch_id, status="in_progress", output_file_id=None)
+        out_id = f"out-{batch_id}"
+        self.uploaded[out_id] = _output_jsonl(self.uploaded[job["input"]])
+        return SimpleNamespace(id=batch_id, status="completed", output_file_id=out_id)
+
+    def _content(self, file_id):
+        return SimpleNamespace(text=self.uploaded[file_id])
+
+
+class FakeMistral:
+    """
+    client.files.upload / client.batch.jobs.create / get / files.download.
+    """
+
+    def __init__(self, polls_until_done=2):
+        self.uploaded = {}
+        self.jobs = {}
+        self.polls_until_done = polls_until_done
+        self.files = SimpleNamespace(upload=self._upload, download=self._download)
+        self.batch = SimpleNamespace(jobs=SimpleNamespace(create=self._create, get=self._get))
+
+    def _upload(self, file, purpose):
+        assert purpose == "batch"
+        fid = f"file-{len(self.uploaded)}"
+        self.uploaded[fid] = file["content"].decode("utf-8")
+        return SimpleNamespace(id=fid)
+
+    def _create(self, input_files, model, endpoint):
+        jid = f"job-{len(self.jobs)}"
+        self.jobs[jid] = {"input": input_files[0], "polls": 0}
+        return SimpleNamespace(id=jid, status="QUEUED", output_file=None)
+
+    def _get(self, job_id):
+        job = self.jobs[job_id]
+        job["polls"] += 1
+        if job["polls"] < self.polls_until_done:
+            return SimpleNamespace(id=job_id, status="RUNNING", output_file=None)
+        out_id = f"out-{job_id}"
+        self.uploaded[out_id] = _output_jsonl(self.uploaded[job["input"]])
+        return SimpleNamespace(id=job_id, status="SUCCESS", output_file=out_id)
+
+    def _download(self, file_id):
+        return io.BytesIO(self.uploaded[file_id].encode("utf-8"))
+
+
+def _bodies():
+    return [(custom_id_for(i), {"model": "m", "messages": [{"role": "user", "content": str(i)}]})
+            for i in QUERY_IDS]
+
+
+def _expected():
+    return ["" if custom_id_for(i) == FAILING else _answer(custom_id_for(i))
+            for i in QUERY_IDS]
+
+
+def test_openai_batch_results_by_custom_id(tmp_path):
+    path = write_batch_file(str(tmp_path / "batch.jsonl"), _bodies())
+    client = FakeOpenAI()
+    results = submit_openai(client, path, poll_secs=0)
+    assert [results.get(custom_id_for(i), None) for i in QUERY_IDS] == _expected()
+    assert client.jobs["batch-0"]["polls"] == 2
+
+
+def test_mistral_batch_results_by_custom_id(tmp_path):
+    path = write_batch_file(str(tmp_path / "batch.jsonl"), _bodies(), with_url=False)
+    client = FakeMistral()
+    results = submit_mistral(client, path, "m", poll_secs=0)
+    assert [results.get(custom_id_for(i), None) for i in QUERY_IDS] == _expected()
+
+
+def test_failed_batch_raises(tmp_path):
+    path = write_batch_file(str(tmp_path / "batch.jsonl"), _bodies())
+    client = FakeOpenAI()
+    client._retrieve = lambda batch_id: SimpleNamespace(
+        id=batch_id, status="failed", output_file_id=None)
+    client.batches.retrieve = client._retrieve
+    with pytest.raises(RuntimeError):
+        submit_openai(client, path, poll_secs=0)
+
+
+def test_parse_batch_output_skips_blank_lines():
+    text = _output_jsonl("\n".join(json.dumps({"custom_id": c}) for c, _ in _bodies()))
+    assert parse_batch_output("\n" + text + "\n\n") == dict(
+        zip((custom_id_for(i) for i in QUERY_IDS), _expected()))
@@ -0,0 +1,25 @@
+"""
+Escrita em append dos CSVs dos modos (csv_out.append_csv).
+"""
+import csv
+
+from csv_out import append_csv
+
+
+def read(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def test_header_only_on_first_write(tmp_path):
+    path = tmp_path / "load.csv"
+    append_csv(path, ["db", "qps"], [["a", 1.5]])
+    append_csv(path, ["db", "qps"], [["b", 2.0], ["c", 3.0]])
+    assert read(path) == [["db", "qps"], ["a", "1.5"], ["b", "2.0"], ["c", "3.0"]]
+
+
+def test_no_rows_creates_nothing(tmp_path):
+    path = tmp_path / "diff.csv"
+    append_csv(path, ["db"], [])
+    append_csv(path, ["db"], None)
+    assert not path.exists()
@@ -0,0 +1,110 @@
+"""
+Comparação de resultados ordenados do teste diferencial (equivalence.py):
+chave do ORDER BY, grupos de empate e LIMIT.
+"""
+from equivalence import order_spec, _tie_groups, compare_results
+
+
+class FakeCursor:
+    """
+    Responde só às queries de sonda (LIMIT + 1); guarda o que rodou.
+    """
+    def __init__(self, results=None):
+        self.results = results or {}
+        self.executed = []
+        self.description = None
+        self._rows = []
+
+    def execute(self, sql):
+        self.executed.append(sql)
+        self._rows = self.results.get(sql, [])
+        self.description = None if sql.startswith(("SAVEPOINT", "RELEASE")) else [("c",)]
+
+    def fetchall(self):
+        return self._rows
+
+
+def test_order_by_position_alias_and_expression():
+    assert order_spec("SELECT a, b FROM t ORDER BY 2, 1")["keys"] == [1, 0]
+    assert order_spec("SELECT a AS x, b FROM t ORDER BY x")["keys"] == [0]
+    assert order_spec("SELECT a, b + 1 FROM t ORDER BY b + 1")["keys"] == [1]
+    assert order_spec("SELECT t.a, t.b FROM t ORDER BY t.b")["keys"] == [1]
+
+
+def test_output_alias_wins_over_input_column():
+    # no Postgres "ORDER BY a" usa a coluna de saída chamada a
+    assert order_spec("SELECT b AS a, a AS b FROM t ORDER BY a")["keys"] == [0]
+
+
+def test_key_outside_the_output_is_unknown():
+    assert order_spec("SELECT a FROM t ORDER BY b")["keys"] is None
+    assert order_spec("SELECT a FROM t ORDER BY 3")["keys"] is None
+    assert order_spec("SELECT * FROM t ORDER BY a")["keys"] is None
+
+
+def test_without_order_by_there_is_no_spec():
+    assert order_spec("SELECT a FROM t") is None
+    assert order_spec("SELECT a FROM t WHERE") is None
+
+
+def test_limit_and_probe():
+    spec = order_spec("SELECT a FROM t ORDER BY a LIMIT 5")
+    assert spec["limit"] == 5
+    assert "LIMIT 6" in spec["probe"]
+    assert order_spec("SELECT a FROM t ORDER BY a")["limit"] is None
+    assert order_spec("SELECT a FROM t ORDER BY a LIMIT %s")["limit"] == "?"
+
+
+def test_tie_groups_are_multisets_in_key_order():
+    rows = [(1, "x"), (1, "y"), (2, "z"), (1, "w")]
+    groups = _tie_groups(rows, [0])
+    assert [k for k, _ in groups] == [repr((1,)), repr((2,)), repr((1,))]
+    assert _tie_groups([(1, "y"), (1, "x")], [0]) == _tie_groups([(1, "x"), (1, "y")], [0])
+    assert _tie_groups([(1, "x"), (2, "y")], [0]) != _tie_groups([(2, "y"), (1, "x")], [0])
+
+
+def test_unordered_compares_multisets():
+    cur = FakeCursor()
+    assert compare_results(cur, "SELECT a FROM t", "SELECT a FROM t",
+                           [(1,), (2,)], [(2,), (1,)], ordered=False) == "agree"
+    assert compare_results(cur, "SELECT a FROM t", "SELECT a FROM t",
+                           [(1,), (1,)], [(1,)], ordered=False) == "disagree"
+
+
+def test_ordered_ties_may_come_in_any_order():
+    q = "SELECT k, v FROM t ORDER BY k"
+    cur = FakeCursor()
+    ro = [(1, "a"), (1, "b"), (2, "c")]
+    assert compare_results(cur, q, q, ro, [(1, "b"), (1, "a"), (2, "c")], True) == "agree"
+    assert compare_results(cur, q, q, ro, [(2, "c"), (1, "a"), (1, "b")], True) == "disagree"
+    assert cur.executed == []
+
+
+def test_order_only_difference_without_output_key_is_skipped():
+    q = "SELECT v FROM t ORDER BY k"
+    cur = FakeCursor()
+    assert compare_results(cur, q, q, [("a",), ("b",)], [("b",), ("a",)], True) == "skip"
+    assert compare_results(cur, q, q, [("a",), ("b",)], [("a",), ("c",)], True) == "disagree"
+
+
+def test_limit_cutting_a_tie_is_skipped():
+    q = "SELECT k, v FROM t ORDER BY k LIMIT 2"
+    probe = order_spec(q)["probe"]
+    cur = FakeCursor({probe: [(1, "a"), (2, "b"), (2, "c")]})
+    assert compare_results(cur, q, q, [(1, "a"), (2, "b")], [(1, "a"), (2, "c")], True) == "skip"
+    assert probe in cur.executed
+
+
+def test_limit_not_cutting_a_tie_is_compared():
+    q = "SELECT k, v FROM t ORDER BY k LIMIT 2"
+    probe = order_spec(q)["probe"]
+    cur = FakeCursor({probe: [(1, "a"), (2, "b"), (3, "c")]})
+    assert compare_results(cur, q, q, [(1, "a"), (2, "b")], [(1, "a"), (2, "b")], True) == "agree"
+    assert compare_results(cur, q, q, [(1, "a"), (2, "b")], [(1, "a"), (2, "x")], True) == "disagree"
+
+
+def test_limit_larger_than_result_needs_no_probe():
+    q = "SELECT k FROM t ORDER BY k LIMIT 10"
+    cur = FakeCursor()
+    assert compare_results(cur, q, q, [(1,), (2,)], [(1,), (2,)], True) == "agree"
+    assert cur.executed == []
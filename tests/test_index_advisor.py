@@ -0,0 +1,35 @@
+"""
+Leitura dos CSVs de resultados pelo advisor (index_advisor.best_rewrites).
+"""
+import os
+
+from index_advisor import best_rewrites, speedup_column
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def test_legacy_header_reads_speedup_by_position():
+    best = best_rewrites(os.path.join(FIXTURES, "results_legacy_header.csv"))
+    # a de maior speedup (1.213), não a de maiores emissões (9.9e-05)
+    assert best == {1: "SELECT a FROM t -- fast"}
+
+
+def test_fixed_header_reads_speedup_by_name():
+    best = best_rewrites(os.path.join(FIXTURES, "results_fixed_header.csv"))
+    assert best == {2: "SELECT b FROM u -- ok"}
+
+
+def test_rewrites_with_wrong_results_are_ignored_across_files():
+    best = best_rewrites(os.path.join(FIXTURES, "results_*_header.csv"))
+    assert best == {1: "SELECT a FROM t -- fast", 2: "SELECT b FROM u -- ok"}
+
+
+def test_speedup_column():
+    assert speedup_column(["query_id", "emissions_original", "emissions_rewritten",
+                           "speedup", "buffers_ratio"]) == 1
+    assert speedup_column(["query_id", "speedup", "buffers_ratio",
+                           "emissions_original", "emissions_rewritten"]) == 1
+    # test_Mistral_Nemo: emissões antes do speedup, sem buffers_ratio, e alinhado
+    assert speedup_column(["emissions_original", "emissions_rewritten",
+                           "speedup", "same_rowcount"]) == 2
+    assert speedup_column(["query_id"]) is None
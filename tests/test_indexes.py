@@ -0,0 +1,49 @@
+"""
+Índices reais temporários (indexes.create_real / drop_real).
+"""
+from indexes import create_real, drop_real
+
+
+class FakeConn:
+    def __init__(self, fail_on=None):
+        self.executed = []
+        self.fail_on = fail_on
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql):
+        if self.fail_on is not None and self.fail_on in sql:
+            raise RuntimeError("CREATE falhou")
+        self.executed.append(sql)
+
+
+CANDS = [("webshop", "order", ("customer",)), ("webshop", "stock", ("articleid",))]
+
+
+def test_names_are_unique_per_run_and_nothing_is_dropped_first():
+    conn = FakeConn()
+    first = create_real(conn, CANDS, [])
+    second = create_real(conn, CANDS, [])
+    names = [n for _, n in first + second]
+    assert len(set(names)) == 4
+    assert all(sql.startswith("CREATE INDEX") for sql in conn.executed)
+
+
+def test_drop_only_what_was_created():
+    conn = FakeConn(fail_on='"stock"')
+    created = []
+    try:
+        create_real(conn, CANDS, created)
+    except RuntimeError:
+        pass
+    assert len(created) == 1
+    conn.executed.clear()
+    drop_real(conn, created)
+    assert conn.executed == [f'DROP INDEX IF EXISTS "webshop".{created[0][1]}']
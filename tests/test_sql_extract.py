@@ -0,0 +1,33 @@
+"""
+Regressões do extrator de SQL (sql_extract.py).
+"""
+from sql_extract import extract_sql
+
+
+def test_prose_after_query_is_not_a_statement():
+    text = ("SELECT a FROM t WHERE b IN (SELECT b FROM u)\n"
+            "This avoids repeated SELECT work per row.")
+    assert extract_sql(text) == "SELECT a FROM t WHERE b IN (SELECT b FROM u)"
+
+
+def test_keyword_inside_note_is_ignored():
+    text = ("SELECT a FROM t WHERE EXISTS (SELECT 1 FROM u WHERE u.x = t.x);\n\n"
+            "Note: SELECT 1 inside EXISTS is cheap.")
+    assert extract_sql(text) == "SELECT a FROM t WHERE EXISTS (SELECT 1 FROM u WHERE u.x = t.x);"
+
+
+def test_prose_line_before_query_is_not_included():
+    text = ("The optimized query uses SELECT DISTINCT to remove dups.\n"
+            "SELECT DISTINCT a FROM t")
+    assert extract_sql(text) == "SELECT DISTINCT a FROM t"
+
+
+def test_last_fenced_block_wins():
+    text = ("First try:\n```sql\nSELECT 1 FROM a\n```\n"
+            "Better:\n```sql\nSELECT 2 FROM b;\n```\nSELECT is fast here.")
+    assert extract_sql(text) == "SELECT 2 FROM b;"
+
+
+def test_unparseable_answer_returns_empty():
+    assert extract_sql("SELECT a FROM t WHERE") == ""
+    assert extract_sql("we select the rows that match") == ""
@@ -0,0 +1,52 @@
+"""
+Quando same_query() (sql_fingerprint.py) considera duas queries a mesma
+e pode reaproveitar a medição.
+"""
+from sql_fingerprint import same_query
+
+
+def test_different_literals_are_different_queries():
+    assert not same_query("SELECT * FROM t WHERE a = 1",
+                          "SELECT * FROM t WHERE a = 2")
+    assert not same_query("SELECT * FROM t WHERE a = 'x'",
+                          "SELECT * FROM t WHERE a = 'y'")
+    assert not same_query("SELECT * FROM t WHERE a = 1.5",
+                          "SELECT * FROM t WHERE a = 15")
+
+
+def test_renamed_aliases_are_the_same_query():
+    assert same_query("SELECT a.x FROM t a JOIN u b ON a.id = b.id",
+                      "SELECT z.x FROM t AS z JOIN u AS w ON z.id = w.id")
+
+
+def test_self_join_with_aliases_swapped_consistently_is_the_same_query():
+    assert same_query(
+        "SELECT a.id FROM t a JOIN t b ON a.p = b.id WHERE b.x = 1",
+        "SELECT b.id FROM t b JOIN t a ON b.p = a.id WHERE a.x = 1")
+
+
+def test_self_join_reading_the_other_side_is_a_different_query():
+    assert not same_query(
+        "SELECT a.id FROM t a JOIN t b ON a.p = b.id",
+        "SELECT b.id FROM t a JOIN t b ON a.p = b.id")
+
+
+def test_quoted_lowercase_identifier_equals_unquoted():
+    assert same_query('SELECT "name" FROM "users" WHERE "id" = 1',
+                      "SELECT Name FROM USERS WHERE id = 1")
+
+
+def test_quoted_mixed_case_identifier_is_a_different_name():
+    assert not same_query('SELECT "Name" FROM "Users"',
+                          "SELECT name FROM users")
+
+
+def test_comments_whitespace_and_case_are_ignored():
+    assert same_query("SELECT a -- coluna\nFROM   t  /* tabela */\tWHERE b=1;",
+                      "select a from t where b = 1")
+
+
+def test_different_columns_or_tables_are_different_queries():
+    assert not same_query("SELECT a FROM t WHERE b = 1",
+                          "SELECT a FROM t WHERE c = 1")
+    assert not same_query("SELECT a FROM t", "SELECT a FROM u")
@@ -0,0 +1,155 @@
+"""
+Spans de tracing por estágio do runner e exportação da linha do tempo.
+
+Não dá para saber onde vai o tempo de uma varredura: latência do
+provedor, extração da SQL, conexão, execução, EXPLAIN, hash do
+resultado, start/stop do CodeCarbon, escrita dos CSVs... Cada estágio é
+envolvido num span:
+
+    with span("explain_json", query_id=i, db=db):
+        ...
+    annotate(prompt_tokens=120)   # atributo no span aberto mais interno
+
+Cada span guarda início/fim (relógio monotônico, perf_counter_ns), a
+thread, os atributos e o erro, se o bloco levantou exceção. No fim da
+execução:
+
+- export_chrome_trace(): JSON no formato Chrome trace (eventos "X"),
+  aberto no chrome://tracing ou no https://ui.perfetto.dev;
+- summary() / write_summary(): tabela por estágio (nº, total, média,
+  p50, p95, máx, erros, % do tempo de parede).
+
+Desligado (padrão), span() não registra nada.
+"""
+import os
+import csv
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+SUMMARY_FIELDS = ["stage", "count", "total_ms", "mean_ms", "p50_ms",
+                  "p95_ms", "max_ms", "errors", "wall_pct"]
+
+
+class Tracer:
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.spans = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._t0 = time.perf_counter_ns()
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        if not self.enabled:
+            yield attrs
+            return
+        rec = {"name": name, "tid": threading.get_ident(), "attrs": attrs,
+               "error": "", "start": time.perf_counter_ns()}
+        stack = self._stack()
+        stack.append(rec)
+        try:
+            yield attrs
+        except BaseException as e:
+            rec["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            rec["end"] = time.perf_counter_ns()
+            stack.pop()
+            with self._lock:
+                self.spans.append(rec)
+
+    def annotate(self, **attrs):
+        """
+        Acrescenta atributos ao span aberto mais interno desta thread.
+        """
+        if self.enabled and self._stack():
+            self._stack()[-1]["attrs"].update(attrs)
+
+    def export_chrome_trace(self, path: str):
+        events = []
+        pid = os.getpid()
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start"])
+        for s in spans:
+            args = {k: v if isinstance(v, (int, float, str, bool)) or v is None else str(v)
+                    for k, v in s["attrs"].items()}
+            if s["error"]:
+                args["error"] = s["error"]
+            events.append({
+                "name": s["name"],
+                "cat": "error" if s["error"] else "stage",
+                "ph": "X",
+                "ts": (s["start"] - self._t0) / 1000.0,   # µs
+                "dur": (s["end"] - s["start"]) / 1000.0,
+                "pid": pid,
+                "tid": s["tid"],
+                "args": args,
+            })
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def summary(self):
+        """
+        Lista de dicts (SUMMARY_FIELDS), do estágio mais caro ao mais barato.
+        Spans aninhados contam nos dois estágios, então wall_pct não soma 100.
+        """
+        with self._lock:
+            spans = list(self.spans)
+        if not spans:
+            return []
+        wall = max(s["end"] for s in spans) - min(s["start"] for s in spans)
+        by_stage = {}
+        for s in spans:
+            by_stage.setdefault(s["name"], []).append(s)
+        out = []
+        for name, ss in by_stage.items():
+            durs = sorted((s["end"] - s["start"]) / 1e6 for s in ss)
+            total = sum(durs)
+            out.append({
+                "stage": name,
+                "count": len(durs),
+                "total_ms": total,
+                "mean_ms": total / len(durs),
+                "p50_ms": durs[len(durs) // 2],
+                "p95_ms": durs[min(len(durs) - 1, int(round(0.95 * (len(durs) - 1))))],
+                "max_ms": durs[-1],
+                "errors": sum(1 for s in ss if s["error"]),
+                "wall_pct": total / (wall / 1e6) * 100.0 if wall else float("nan"),
+            })
+        return sorted(out, key=lambda r: -r["total_ms"])
+
+    def write_summary(self, path: str):
+        rows = self.summary()
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(SUMMARY_FIELDS)
+            for r in rows:
+                w.writerow([r[k] for k in SUMMARY_FIELDS])
+        return rows
+
+    def print_summary(self):
+        print(f"{'estágio':<24}{'n':>6}{'total ms':>12}{'média':>10}{'p95':>10}{'erros':>7}{'% parede':>10}")
+        for r in self.summary():
+            print(f"{r['stage']:<24}{r['count']:>6}{r['total_ms']:>12.1f}"
+                  f"{r['mean_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['errors']:>7}"
+                  f"{r['wall_pct']:>9.1f}%")
+
+
+# Tracer global do processo: os runners ligam com tracer.enabled = True
+tracer = Tracer()
+
+
+def span(name: str, **attrs):
+    return tracer.span(name, **attrs)
+
+
+def annotate(**attrs):
+    tracer.annotate(**attrs)